@@ -96,6 +96,69 @@ def load_lzw(path, import_roi=False):
     return BF.openImagePlus(opts)[0]  # Provided as array, but should only have one element.
 
 
+def is_rgb_file(path):
+    """ Check if image at PATH is RGB by reading file metadata only (no pixel data is read).
+    """
+    DebugTools.setRootLevel('error')
+    reader = ImageReader()
+    reader.setId(path)
+    result = reader.isRGB()
+    reader.close()
+    DebugTools.setRootLevel('warn')
+    return result
+
+
+def get_czi_colors(reader):
+    """ Get display color of each channel from the metadata of an initialized CZI reader.
+    """
+    c_count = reader.getSizeC()
+    i_count = reader.getMetadataValue('Information|Image|SizeI #1')  # For dual illumination.
+    if i_count: i_count = int(i_count)  # Can't run int() on None type.
+    # Color value could be in different locations depending on source scope.
+    # Not sure of best way to best identify scope yet...  ## TODO
+    acq_mode = reader.getMetadataValue('Information|Image|Channel|AcquisitionMode #1')
+    if reader.isRGB():
+        # The three channels are part of a color RGB image, not separate wavelengths.
+        colors = {0:Color(255, 0, 0, 255), 1:Color(0, 255, 0, 255), 2:Color(0, 0, 255, 255)}
+    else:
+        # Get color for each channel from metadata.
+        colors = dict()
+        for i in range(c_count):
+            if i_count > 1:
+                i2 = i % i_count
+            else:
+                i2 = i
+            if acq_mode == 'SPIM':  # For Lightsheet.
+                hex = reader.getMetadataValue('Experiment|AcquisitionBlock|MultiTrackSetup|TrackSetup|Detector|Color #%d' % (i2+1))
+            elif acq_mode == 'WideField':  # For Macroscope.
+                hex = reader.getMetadataValue('Information|Image|Channel|Color #%d' % (i2+1))
+            else:
+                hex = '#FFFFFFFF' ## TODO (this will probably cause an error for now...)
+            hex = int(hex.replace('#',''), 16)  # Convert from hex string to int.
+            a = (hex & 0xFF000000) >> 24  # Extract alpha value.
+            r = (hex & 0XFF0000) >> 16    # Extract red value.
+            g = (hex & 0XFF00) >> 8       # Extract green value.
+            b = (hex & 0XFF)              # Extract blue value.
+            colors[i] = Color(r, g, b, a)
+    return colors
+
+
+def get_czi_luts(path):
+    """ Get channel LUTs and display range max of a CZI using metadata only (no pixel data is read).
+    
+        Display range max follows pixel bit depth, matching an import with autoscale off.
+    """
+    DebugTools.setRootLevel('error')
+    reader = ImageReader()
+    reader.setId(path)
+    colors = get_czi_colors(reader)
+    luts = [LUT.createLutFromColor(colors[i]) for i in range(reader.getSizeC())]
+    max_range = float(2 ** reader.getBitsPerPixel() - 1)
+    reader.close()
+    DebugTools.setRootLevel('warn')
+    return luts, max_range
+
+
 def open_czi(path, series=0, split_channels=False, pyramid=False, res_level=1, crop=None):
     """ Import a multi-channel Zeiss CZI image with each channel preserving the original color.
     
@@ -152,34 +215,7 @@ def open_czi(path, series=0, split_channels=False, pyramid=False, res_level=1, c
     if series > s_count-1:
         logerror(ValueError, 'Series [%d] not found, only %d available..!' % (series, s_count))
     c_count = reader.getSizeC()
-    i_count = reader.getMetadataValue('Information|Image|SizeI #1')  # For dual illumination.
-    if i_count: i_count = int(i_count)  # Can't run int() on None type.
-    # Color value could be in different locations depending on source scope.
-    # Not sure of best way to best identify scope yet...  ## TODO
-    acq_mode = reader.getMetadataValue('Information|Image|Channel|AcquisitionMode #1')
-    if reader.isRGB():
-        # The three channels are part of a color RGB image, not separate wavelengths.
-        colors = {0:Color(255, 0, 0, 255), 1:Color(0, 255, 0, 255), 2:Color(0, 0, 255, 255)}
-    else:
-        # Get color for each channel from metadata.
-        colors = dict()
-        for i in range(c_count):
-            if i_count > 1:
-                i2 = i % i_count
-            else:
-                i2 = i
-            if acq_mode == 'SPIM':  # For Lightsheet.
-                hex = reader.getMetadataValue('Experiment|AcquisitionBlock|MultiTrackSetup|TrackSetup|Detector|Color #%d' % (i2+1))
-            elif acq_mode == 'WideField':  # For Macroscope.
-                hex = reader.getMetadataValue('Information|Image|Channel|Color #%d' % (i2+1))
-            else:
-                hex = '#FFFFFFFF' ## TODO (this will probably cause an error for now...)
-            hex = int(hex.replace('#',''), 16)  # Convert from hex string to int.
-            a = (hex & 0xFF000000) >> 24  # Extract alpha value.
-            r = (hex & 0XFF0000) >> 16    # Extract red value.
-            g = (hex & 0XFF00) >> 8       # Extract green value.
-            b = (hex & 0XFF)              # Extract blue value.
-            colors[i] = Color(r, g, b, a)
+    colors = get_czi_colors(reader)
     reader.close()
     # Built LUT list for colors (used for certain programs).
     luts = [LUT.createLutFromColor(colors[i]) for i in range(c_count)]
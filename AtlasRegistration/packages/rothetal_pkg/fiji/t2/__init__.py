@@ -140,7 +140,7 @@ def add_layer(z, layer_name='', auto_name=False):
 def are_all_done(futures):
     """ Check if all futures in list are completed.
     """
-    return all([f.isDone() for f in futures])
+    return all(f.isDone() for f in futures)
 
 
 def wait(futures, msg):
@@ -51,6 +51,24 @@ def get_relative_scale(elem):
     return pw / ((2 * get_embedded_cal(elem, u)) / (get_scale(elem,0) + get_scale(elem,1)))
 
 
+def get_relative_scales(elems):
+    """ Get relative scaling of a list of objects within the project coordinate space.
+        Assumes all objects share a layerset, so calibration is only looked up once.
+    """
+    if not elems:
+        return []
+    cal = elems[0].getLayerSet().getCalibrationCopy()
+    pw = cal.pixelWidth
+    u = cal.getUnit()
+    scales = []
+    for elem in elems:
+        at = elem.getAffineTransformCopy()
+        sx = (at.getScaleX()**2 + at.getShearX()**2) ** 0.5
+        sy = (at.getScaleY()**2 + at.getShearY()**2) ** 0.5
+        scales.append(pw / ((2 * get_embedded_cal(elem, u)) / (sx + sy)))
+    return scales
+
+
 def get_scale(elem, dim=0):
     """ Get scale component of object's affine transform, in x- or y-dimension.
     """
@@ -108,7 +108,7 @@ def normalize(layerset, layers=None, match_cal=False):
     
     for layer in layers:
         patches = layer.getDisplayables(Patch)
-        if any([patch.isLocked() for patch in patches]):
+        if any(patch.isLocked() for patch in patches):
             # Skip layer normalization if locked patches are found.
             rescale_fail.append('%s (z=%0.1f)' % (layer.getTitle(), layer.getZ()))
             logmsg('Locked patches in %s (z=%0.1f), will not be normalized!' % (layer.getTitle().encode('utf-8'), layer.getZ()), False)
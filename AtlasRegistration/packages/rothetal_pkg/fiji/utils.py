@@ -147,22 +147,30 @@ def lower_ext(path):
         shutil.move(os.path.join(path, f), os.path.join(path, name + ext.lower()))
 
 
-def find_files_by_ext(base, ext, splitext=False, d=None):
+def find_files_by_ext(base, ext, splitext=False, d=None, skip_dirs=('__MACOSX', 'trash')):
     """ Find all files with matching extension in recursive search path.
         Return as dict with file:fullpath mapping.
         Enable SPLITEXT to trim extension from dict keys.
         Provide existing dict to RES if you want to append.
+        Directories named in SKIP_DIRS, hidden directories and trakem2 directories
+        (e.g. mipmaps) are not searched.
     """
     if not d: d = {}
     r = re.compile('^[^\._].*\.'+ext+'$', re.I)  # Excluding ._ thumbnails.
-    for root, dirs, files in os.walk(base, topdown=False):
-        dirs[:] = filter(re.compile('^[^trakem2\.[0-9]+]').match, dirs)  # Exclude trakem2 directories.
+    r_skip = re.compile('^(\.|trakem2\.)', re.I).match  # Hidden and trakem2 directories.
+    seen = set()
+    # Walk top-down so excluded directories are pruned before descending into them.
+    for root, dirs, files in os.walk(base):
+        dirs[:] = [x for x in dirs if x not in skip_dirs and not r_skip(x)]
         for f in filter(r.match, files):
             f_path = os.path.join(root, f)
             if splitext:
                 f,_ = os.path.splitext(f)
-            if f in d.keys() and d[f] != f_path:
+            if f in d and d[f] != f_path:
                 logmsg('"%s" found more than once in search path, only one source kept!' % f)
+            if f in seen:
+                continue  # Keep shallowest match.
+            seen.add(f)
             d[f] = f_path
     return d
 
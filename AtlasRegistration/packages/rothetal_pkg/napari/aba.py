@@ -26,7 +26,7 @@ def get_aba(res=RES, name='allen'):
     return BrainGlobeAtlas('%s_mouse_%sum' % (name, res))
 
 
-def get_aba_mask(structure, aba=None, res=RES, nanzero=False, hemi=False, ap_resample=False):
+def get_aba_mask(structure, aba=None, res=RES, nanzero=False, hemi=False, ap_resample=False, as_bool=False):
     if aba is None:
         aba = get_aba(res)
     else:
@@ -35,20 +35,29 @@ def get_aba_mask(structure, aba=None, res=RES, nanzero=False, hemi=False, ap_res
     mask = aba.get_structure_mask(id)
     if ap_resample:
         mask = mask[::int(ap_resample / res), :, :]
+    if as_bool:  # Before hemi, so hemi zeroing is done on 1-byte values.
+        mask = mask != 0
     if hemi:
-        mid = mask.shape[2] // 2
-        if hemi.lower().startswith('l'):
-            mask[:,:,:mid] = 0
-        elif hemi.lower().startswith('r'):
-            mask[:,:,mid:] = 0
-        else:
-            raise ValueError('Incorrect value for HEMI!  Must be <False, \'left\', or \'right\'>...')
+        mask = apply_hemi(mask, hemi)
     if nanzero:
         mask = mask.astype('float')
         mask[mask==0] = np.nan
     return mask
 
 
+def apply_hemi(mask, hemi):
+    """ Zero out (in place) the hemisphere of <mask> not selected by <hemi>.
+    """
+    mid = mask.shape[2] // 2
+    if hemi.lower().startswith('l'):
+        mask[:,:,:mid] = 0
+    elif hemi.lower().startswith('r'):
+        mask[:,:,mid:] = 0
+    else:
+        raise ValueError('Incorrect value for HEMI!  Must be <False, \'left\', or \'right\'>...')
+    return mask
+
+
 def add_mask_to_viewer(structure, viewer=None, show=True, aba=None, hemi=False, res=RES, **kwargs):
     if viewer is None:
         viewer = napari.current_viewer()
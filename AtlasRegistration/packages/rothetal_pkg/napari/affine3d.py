@@ -150,7 +150,18 @@ class affine3d:
 
 def apply_affine(obj, at):
     try:
-        obj.vertices = unpad(pad(obj.vertices) @ at.T)
+        obj.vertices = apply_affine_fast(np.asarray(obj.vertices), at)
     except AttributeError:
-        obj = unpad(pad(obj) @ at.T)
-    return obj
\ No newline at end of file
+        obj = apply_affine_fast(np.asarray(obj), at)
+    return obj
+
+
+def apply_affine_fast(verts, at):
+    """ Transform Nx3 VERTS by 4x4 AT (computed and returned as float64).  If AT is
+        a plain affine (last row 0, 0, 0, 1) this is one matmul + offset without padding VERTS.
+    """
+    at = np.asarray(at, dtype=np.float64)
+    verts = np.asarray(verts, dtype=np.float64)
+    if not np.array_equal(at[3, :], (0, 0, 0, 1)):
+        return unpad(pad(verts) @ at.T)
+    return (verts @ at[:3, :3].T) + at[:3, 3]
\ No newline at end of file
@@ -93,38 +93,48 @@ def get_slice_offsets_upper_left(ref, obj, zs, at=None):
     return xy_offsets
 
 
-def poly_area(p, x_col=1, y_col=2):
+def poly_area(p, x_col=1, y_col=2, closed=False):
         """ Area of NON-INTERSECTING polygon.
         
             Point array P could have other dimensions, so must specify 
-            which ones to use for calculation.
+            which ones to use for calculation.  Set CLOSED if the last
+            point of P already repeats the first.
         """
-        p = np.array(p)
-        n = p.shape[0]
-        x = np.hstack((p[:, x_col], p[0, x_col]))
-        y = np.hstack((p[:, y_col], p[0, y_col]))
-        return 0.5 * np.sum((x[:n] * y[1:]) - (x[1:] * y[:n]))
+        x0, y0, x1, y1 = poly_edges(p, x_col, y_col, closed)
+        return 0.5 * np.sum((x0 * y1) - (x1 * y0))
 
 
-def poly_com(p, x_col=1, y_col=2):
+def poly_com(p, x_col=1, y_col=2, closed=False):
     """ Center of mass of NON-INTERSECTING polygon.
     
         Point array P could have other dimensions, so must specify 
-        which ones to use for calculation.
+        which ones to use for calculation.  Set CLOSED if the last
+        point of P already repeats the first.
     """
-    p = np.array(p)
-    n = p.shape[0]
-    x = np.hstack((p[:, x_col], p[0, x_col]))
-    y = np.hstack((p[:, y_col], p[0, y_col]))
-    A = 0.5 * np.sum((x[:n] * y[1:]) - (x[1:] * y[:n]))
-    Mx = np.sum((x[:n] + x[1:]) * ((x[:n] * y[1:]) - (x[1:] * y[:n]))) / 6.
-    My = np.sum((y[:n] + y[1:]) * ((x[:n] * y[1:]) - (x[1:] * y[:n]))) / 6.
+    x0, y0, x1, y1 = poly_edges(p, x_col, y_col, closed)
+    cross = (x0 * y1) - (x1 * y0)
+    A = 0.5 * np.sum(cross)
+    Mx = np.sum((x0 + x1) * cross) / 6.
+    My = np.sum((y0 + y1) * cross) / 6.
     return np.array((Mx / A, My / A))
 
 
+def poly_edges(p, x_col=1, y_col=2, closed=False):
+    """ Start and end coordinates (x0, y0, x1, y1) of each polygon edge.
+    
+        A CLOSED polygon is sliced as views, otherwise the end points are
+        a single rolled copy of the start points.
+    """
+    p = np.asarray(p)
+    x = p[:, x_col]
+    y = p[:, y_col]
+    if closed:
+        return x[:-1], y[:-1], x[1:], y[1:]
+    return x, y, np.roll(x, -1), np.roll(y, -1)
+
+
 def sample_xy_span_at_z(mesh, z, steps=np.arange(0.05, 1.0, 0.1), tol=0.0001, return_mean=False):
     # Default is 0.05, 0.15 ... 0.95.
-    n = len(steps)
     s = mesh.intersect_with_plane(origin=(z,0,0), normal=(1,0,0)).join_segments(tol=tol)
     if len(s) == 0:
         return None, None
@@ -134,26 +144,46 @@ def sample_xy_span_at_z(mesh, z, steps=np.arange(0.05, 1.0, 0.1), tol=0.0001, re
     s = s[0]
     bounds_0 = s.bounds()[2:4]
     bounds_1 = s.bounds()[4:6]
-    lim_0 = np.diff(bounds_0)
-    lim_1 = np.diff(bounds_1)
-    lr = LinearRing(s.vertices[:, 1:])
-    dim_0_lengths = np.zeros(n)
-    dim_1_lengths = np.zeros(n)
-    for i in range(n):
-        # dim 0
-        d = bounds_0[0] + (lim_0 * steps[i])
-        p = LineString(((d, bounds_1[0]), (d, bounds_1[1]))).intersection(lr)
-        dim_0_lengths[i] = abs(p.geoms[1].y - p.geoms[0].y)
-        # dim 1
-        d = bounds_1[0] + (lim_1 * steps[i])
-        p = LineString(((bounds_0[0], d), (bounds_0[1], d))).intersection(lr)
-        dim_1_lengths[i] = abs(p.geoms[1].x - p.geoms[0].x)
+    p = s.vertices[:, 1:]
+    steps = np.asarray(steps)
+    # All scanlines at once, no Shapely geometries.
+    dim_0_lengths = scanline_spans(p, bounds_0[0] + ((bounds_0[1] - bounds_0[0]) * steps), axis=0)
+    dim_1_lengths = scanline_spans(p, bounds_1[0] + ((bounds_1[1] - bounds_1[0]) * steps), axis=1)
     if return_mean:
         return np.mean(dim_0_lengths), np.mean(dim_1_lengths)
     else:
         return dim_0_lengths, dim_1_lengths
 
 
+def scanline_spans(p, ds, axis=0):
+    """ Span of closed polygon P (Nx2) along the other axis, between the
+        first two points where it is crossed by each line P[:, AXIS] == D
+        for D in DS.
+        
+        Lines crossing P exactly twice (the usual case) are done in one
+        (n_edges, n_lines) broadcast.  Any other line falls back to Shapely,
+        whose point order defines the "first two" crossings.
+    """
+    ds = np.asarray(ds)
+    a0, b0, a1, b1 = (e[:, np.newaxis] for e in poly_edges(p, axis, 1 - axis))
+    # Half-open test so a vertex lying on a line is only counted once.
+    tf = (a0 <= ds) != (a1 <= ds)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = b0 + ((ds - a0) * (b1 - b0) / (a1 - a0))
+    spans = np.amax(b, axis=0, where=tf, initial=-np.inf) - np.amin(b, axis=0, where=tf, initial=np.inf)
+    redo = np.flatnonzero(np.count_nonzero(tf, axis=0) != 2)
+    if len(redo):
+        lr = LinearRing(p)
+        lo, hi = np.amin(p[:, 1 - axis]), np.amax(p[:, 1 - axis])
+        for i in redo:
+            line = np.array(((ds[i], lo), (ds[i], hi)))
+            if axis:
+                line = line[:, ::-1]
+            g = LineString(line).intersection(lr).geoms
+            spans[i] = abs(g[1].coords[0][1 - axis] - g[0].coords[0][1 - axis])
+    return spans
+
+
 def span_vol(mesh, steps, axis=0, tol=0.0001):
     # Terrible name, sorry.
     spacing = steps[1] - steps[0]
@@ -74,6 +74,44 @@ def regex_renamer(path=None, regex=None, rep=None, go=False):
     return
 
 
+def _as_nonzero(arr):
+    """ Boolean nonzero-ness of ARR (no copy if it is already boolean).
+    """
+    arr = np.asarray(arr)
+    return arr if arr.dtype == bool else arr != 0
+
+
+def _argmax_or_nan(nz):
+    """ Row-wise argmax of boolean 2D NZ as float, NaN for rows without any True.
+        (A row is empty exactly when the element at its argmax is False, so no separate any() pass is needed.)
+    """
+    idx = np.argmax(nz, axis=1)
+    empty = ~nz[np.arange(nz.shape[0]), idx]
+    idx = idx.astype(float)
+    idx[empty] = np.nan
+    return idx
+
+
+def first_nonzero(arr):
+    """ Index of first nonzero element in each row of 2D ARR, NaN for rows without any.
+    """
+    return _argmax_or_nan(_as_nonzero(arr))
+
+
+def last_nonzero(arr):
+    """ Index of last nonzero element in each row of 2D ARR, NaN for rows without any.
+    """
+    nz = _as_nonzero(arr)
+    return nz.shape[1] - 1 - _argmax_or_nan(nz[:, ::-1])
+
+
+def first_last_nonzero(arr):
+    """ first_nonzero() and last_nonzero() of 2D ARR, sharing a single nonzero conversion.
+    """
+    nz = _as_nonzero(arr)
+    return _argmax_or_nan(nz), nz.shape[1] - 1 - _argmax_or_nan(nz[:, ::-1])
+
+
 def solve_angle(pc, pb, pa, scale=np.array([1, 1])):
     """ Law of cosines where pc is vertex of angle to be solved, and pb, pa are the other vertices of triangle.
         SCALE is used if coordinates are from a non-isotropic coordinate system.
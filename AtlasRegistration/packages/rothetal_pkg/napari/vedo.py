@@ -9,8 +9,15 @@ import os
 import meshio
 import napari
 import numpy as np
+from functools import lru_cache
 from vedo import Mesh
+from vedo import load
 from vedo.utils import is_ragged
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ModuleNotFoundError:
+    HAS_NUMBA = False
 
 from .aba import load_aba_as_mesh
 from .affine3d import apply_affine
@@ -19,13 +26,9 @@ from .affine3d import apply_affine
 def vedo2napari(mesh, name='', scalar_name='scalars', **kwargs):
     """ Convert vedo mesh to napari volume.
     """
-    points = mesh.vertices
-    faces = mesh.cells
-    if len(faces):
-        if is_ragged(faces) or len(faces[0]):
-            tri_mesh = mesh.clone().triangulate()
-            faces = tri_mesh.cells
-    faces = np.asarray(faces, dtype=int)
+    # Only clones + triangulates if there are non-triangle faces.
+    points, faces = mesh2arrays(mesh)
+    points = points.astype(np.float32, copy=False)
     if scalar_name in mesh.pointdata.keys():
         mesh_tuple = (points, faces, mesh.pointdata[scalar_name])
     else:
@@ -34,12 +37,7 @@ def vedo2napari(mesh, name='', scalar_name='scalars', **kwargs):
         print('No mesh to send to napari!')
         return
     if not name:
-        if mesh.name:
-            name = mesh.name
-        elif mesh.filename:
-            name = os.path.basename(mesh.filename).split('.')[0]
-        else:
-            name = 'vedo_mesh'
+        name = mesh_name(mesh, default='vedo_mesh')
     return napari.current_viewer().add_surface(mesh_tuple, name=name, **kwargs)
 
 
@@ -49,7 +47,7 @@ def napari2vedo(layer=None):
     if layer is None:
         layer = viewer.layers.selection.active
     points = layer.data[0].astype(float)
-    faces = layer.data[1].astype(int)
+    faces = layer.data[1].astype(np.int32, copy=False)
     scalars = layer.data[2]
     mesh = Mesh([points, faces])
     if len(scalars) > 0:
@@ -62,39 +60,119 @@ def napari2vedo(layer=None):
 def loadobj2vedo(path, name=''):
     """ Load .obj as a vedo mesh.
     """
-    mesh = meshio.read(path)
+    try:  # vedo reads straight into VTK, no intermediate meshio copy.
+        mesh = load(path)
+    except Exception:
+        mesh = None
+    if not isinstance(mesh, Mesh):
+        m = meshio.read(path)
+        mesh = Mesh([m.points.astype(float), m.cells[0].data.astype(np.int32)])
     if not name:
-        name = os.path.basename(path).split('.')
-    return Mesh([mesh.points.astype(float), mesh.cells[0].data.astype(int)])
+        name = os.path.basename(path).split('.')[0]
+    mesh.name = name
+    return mesh
 
 
 def show_vedo_slice(mesh, layer=None, origin=(0,0,0), normal=(1,0,0), translation=(0,0,0), type='polygon', 
-                    clip=[None]*3, clip_r=[True]*3, name='', viewer=None, scale=1., tol=0.0001, **kwargs):
-    if len(scale) == 1:
-        scale = [scale] * 3
-    if viewer is None:
-        viewer = napari.current_viewer()
+                    clip=[None]*3, clip_r=[True]*3, name='', viewer=None, scale=1., tol=0.0001, return_lines=False, **kwargs):
+    """ Show slice of MESH in shapes LAYER (or a new one).  With RETURN_LINES,
+        the translated/scaled/clipped lines are returned instead, without
+        touching the viewer.
+    """
     if not isinstance(mesh, Mesh):
         mesh = napari2vedo(mesh)
-    lines = mesh.intersect_with_plane(origin=origin, normal=normal).join_segments(tol=tol)
+    lines = slice_mesh(mesh, origin=origin, normal=normal, tol=tol)
     if (not lines) or (lines is None):
         # No slice, exit.
         print('No intersecting slice at origin: %s, normal: %s ...' % (origin, normal))
-        return layer
-    if type=='path':
-        lines = [(np.vstack((line.vertices, line.vertices[0, ...])) + translation) * (1. / scale) for line in lines]
-    else:
-        lines = [np.array(line.vertices + translation) * (1. / scale) for line in lines]
-    # This is a lil' messy.
-    lines = clip_lines(lines, [(clip[i] + translation[i]) / scale[i] if clip[i] is not None else None for i in range(3)], clip_r)
+        return [] if return_lines else layer
+    lines = prepare_slice_lines(lines, translation=translation, type=type, clip=clip, clip_r=clip_r, scale=scale)
+    if return_lines:
+        return lines
+    if (layer is None) and (not name):
+        name = mesh_name(mesh)
+    return add_slice_lines(lines, layer=layer, type=type, name=name, viewer=viewer, scale=scale, **kwargs)
+
+
+def mesh_name(mesh, default=''):
+    """ Name of vedo MESH, falling back to its filename.
+    """
+    if mesh.name:
+        return mesh.name
+    elif mesh.filename:
+        return os.path.basename(mesh.filename).split('.')[0]
+    return default
+
+
+def slice_mesh(mesh, origin=(0,0,0), normal=(1,0,0), tol=0.0001):
+    """ Slice MESH with plane (ORIGIN, NORMAL), returned as a list of vertex arrays.
+    
+        Axis-aligned planes are cut in numpy from the cached triangle arrays,
+        only visiting triangles whose extent spans the plane.  Oblique planes
+        go through VTK.
+    """
+    normal = np.asarray(normal)
+    if np.count_nonzero(normal) != 1:
+        return [line.vertices for line in mesh.intersect_with_plane(origin=origin, normal=normal).join_segments(tol=tol)]
+    axis = np.flatnonzero(normal)[0]
+    value = origin[axis]
+    verts, faces, order, lo, hi = face_bounds(mesh, axis)
+    # Faces sorted by min extent, so only a prefix can span VALUE.
+    idx = order[:np.searchsorted(lo, value, side='right')]
+    idx = idx[hi[idx] >= value]
+    segments, _ = slice_triangles(verts, faces[idx], value, axis=axis)
+    if len(segments) == 0:
+        return []
+    return join_segments(segments, tol=tol)
+
+
+def face_bounds(mesh, axis=0):
+    """ Triangle arrays of MESH, with face order sorted by min extent along
+        AXIS, the sorted mins, and the (unsorted) maxes.
+        
+        Cached on MESH until its points are modified.
+    """
+    mtime = mesh.dataset.GetMTime()
+    cache = getattr(mesh, 'face_bounds_cache', None)
+    if (cache is None) or (cache['mtime'] != mtime):
+        cache = {'mtime': mtime}
+        mesh.face_bounds_cache = cache
+    if axis not in cache:
+        verts, faces = mesh2arrays(mesh)
+        d = verts[faces, axis]
+        lo = np.amin(d, axis=1)
+        order = np.argsort(lo, kind='stable')
+        cache[axis] = (verts, faces, order, lo[order], np.amax(d, axis=1))
+    return cache[axis]
+
+
+def prepare_slice_lines(lines, translation=(0,0,0), type='polygon', clip=[None]*3, clip_r=[True]*3, scale=1.):
+    """ Translate, scale, and clip slice LINES (list of Nx3 vertex arrays).
+    """
+    # Display-only coordinates, so float32 is plenty.
+    translation = np.asarray(translation, dtype=np.float32)
+    inv_scale = np.float32(1.) / np.broadcast_to(np.asarray(scale, dtype=np.float32), (3,))  # Scalar SCALE is OK.
+    clip = [(clip[i] + translation[i]) * inv_scale[i] if clip[i] is not None else None for i in range(3)]
+    closing = int(type=='path')  # Path needs first vertex repeated.
+    out = []
+    for line in lines:
+        n = len(line)
+        v = np.empty((n + closing, 3), dtype=np.float32)
+        np.add(line, translation, out=v[:n])
+        v[n:] = v[:closing]
+        v *= inv_scale
+        out.append(v)
+    return clip_lines(out, clip, clip_r)
+
+
+def add_slice_lines(lines, layer=None, type='polygon', name='', viewer=None, scale=1., **kwargs):
+    """ Add prepared LINES to shapes LAYER in one call, or to a new layer.
+    """
     if not lines:
         return layer
-    if lines and (layer is None):
-        if not name:
-            if mesh.name:
-                name = mesh.name
-            elif mesh.filename:
-                name = os.path.basename(mesh.filename).split('.')[0]
+    if viewer is None:
+        viewer = napari.current_viewer()
+    if layer is None:
         layer = viewer.add_shapes(lines, shape_type=[type]*len(lines), name=name, **kwargs)
         layer.scale *= scale
     else:
@@ -103,41 +181,223 @@ def show_vedo_slice(mesh, layer=None, origin=(0,0,0), normal=(1,0,0), translatio
 
 
 def clip_lines(lines, clip=[None]*3, clip_r=[True]*3):
-    for i in range(3):
-        if clip[i] is not None:
-            for j in range(len(lines))[::-1]:
-                tf = lines[j][:, i] > clip[i]
-                if not clip_r:
-                    tf = ~tf
-                if np.sum(tf) > 1:
-                    lines[j] = lines[j][tf, :]
-                else:
-                    lines.pop(j)
-    return lines
-
-
-def transform_and_slice_mesh(mesh, zs, at=None, translations=None, scale=(1,1,1), clip=None, color='blue', name=None, aba=None):
+    """ Keep vertices of LINES above CLIP[i] along each axis i (below if not
+        CLIP_R[i]).  Lines left with less than two vertices are dropped.
+    """
+    active = [(i, clip[i], not clip_r[i]) for i in range(3) if clip[i] is not None]
+    if not active:
+        return list(lines)
+    # Pack the per-axis tests into one code per vertex (bit i = kept on axis i).
+    target = np.uint8(sum(1 << i for i, _, _ in active))
+    kept = []
+    for line in lines:
+        codes = np.zeros(len(line), dtype=np.uint8)
+        for i, c, flip in active:
+            codes |= ((line[:, i] > c) ^ flip).view(np.uint8) << i
+        tf = codes == target
+        if np.count_nonzero(tf) > 1:
+            kept.append(line[tf, :])
+    return kept
+
+
+def transform_and_slice_mesh(mesh, zs, at=None, translations=None, scale=(1,1,1), clip=None, color='blue', name=None, aba=None, tol=0.0001):
+    """ Slice MESH (or ABA structure name, or a list of either) at every z in
+        ZS and show the outlines in one new shapes layer.
+        
+        All ZS planes are cut from the triangle arrays in one vectorized pass.
+    """
     if isinstance(mesh, list):
         for m in mesh:
-            transform_and_slice_mesh(m, zs, at=at, translations=translations, scale=scale, clip=clip, color=color, name=name, aba=aba)
+            transform_and_slice_mesh(m, zs, at=at, translations=translations, scale=scale, clip=clip, color=color, name=name, aba=aba, tol=tol)
         return
-    try:  # Try MESH as a string, for which we mean an ABA object... convenience!
-        obj = load_aba_as_mesh(mesh, aba=aba)
-        name = mesh
-    except:
-        obj = mesh
     if at is None:
         at = np.eye(4)
     if translations is None:
         translations = np.zeros((len(zs), 3))
     if clip is None:
         clip = [None] * 3
-    obj = apply_affine(obj, at)
-    layer = None
-    for t, z in enumerate(zs):
-        layer = show_vedo_slice(obj, layer=layer, origin=(z,0,0), normal=(1,0,0), translation=translations[t, :], scale=scale,
-                                clip=clip, edge_color=color, edge_width=5, face_color=[0,0,0,0], name=name)
-    return layer
+    try:  # Try MESH as a string, for which we mean an ABA object... convenience!
+        verts, faces = load_aba_transformed(mesh, aba, np.asarray(at, dtype=float).tobytes())
+        name = mesh
+    except:
+        if not name:
+            name = mesh_name(mesh)
+        verts, faces = mesh2arrays(apply_affine(mesh, at))
+    segments, plane_idx = slice_triangles(verts, faces, zs, axis=0)
+    # Segments come out grouped by plane, so split on per-plane counts.
+    bounds = np.cumsum(np.bincount(plane_idx, minlength=len(zs)))
+    lines = []
+    for t, segs in enumerate(np.split(segments, bounds[:-1])):
+        if len(segs) == 0:
+            print('No intersecting slice at z: %s ...' % zs[t])
+            continue
+        lines += prepare_slice_lines(join_segments(segs, tol=tol), translation=translations[t, :], scale=scale, clip=clip)
+    return add_slice_lines(lines, scale=scale, name=name, edge_color=color, edge_width=5, face_color=[0,0,0,0])
+
+
+@lru_cache(maxsize=128)
+def load_aba_transformed(name, aba, at_bytes):
+    """ Vertex and triangle face arrays of ABA structure NAME, transformed by
+        the 4x4 affine given as AT_BYTES (float64 .tobytes()).
+        
+        Cached, so repeated calls for the same structure/affine skip the OBJ
+        read and transform.  Returned arrays are read-only.
+    """
+    verts, faces = mesh2arrays(load_aba_as_mesh(name, aba=aba))
+    verts = apply_affine(np.asarray(verts, dtype=float), np.frombuffer(at_bytes).reshape(4, 4))
+    verts.flags.writeable = False
+    faces.flags.writeable = False
+    return verts, faces
+
+
+def mesh2arrays(mesh):
+    """ Vertex (Nx3) and triangle face (Fx3) arrays of vedo MESH.
+    """
+    faces = mesh.cells
+    if not is_triangles(faces):
+        mesh = mesh.clone().triangulate()
+        faces = mesh.cells
+    return np.asarray(mesh.vertices), np.asarray(faces, dtype=np.int32).reshape(-1, 3)
+
+
+def is_triangles(faces):
+    """ True if all FACES (vedo cells) are triangles.
+    """
+    return (not len(faces)) or ((not is_ragged(faces)) and (len(faces[0]) == 3))
+
+
+def slice_triangles(verts, faces, values, axis=0):
+    """ Cut triangles (VERTS, FACES) with every plane VERTS[:, AXIS] == V, for V in VALUES.
+    
+        Returns segments (Nx2x3) and the index into VALUES of each segment,
+        with segments ordered by plane.
+    """
+    verts = np.asarray(verts)
+    faces = np.asarray(faces)
+    values = np.atleast_1d(values)
+    d = verts[faces, axis]  # Fx3
+    # A triangle straddles a plane if its vertices are not all on one side.
+    straddle = (np.amin(d, axis=1) < values[:, np.newaxis]) & (np.amax(d, axis=1) >= values[:, np.newaxis])
+    plane_idx, tri_idx = np.nonzero(straddle)
+    if len(tri_idx) == 0:
+        return np.zeros((0, 2, 3)), plane_idx
+    # Edges 0-1, 1-2, 2-0, ordered by vertex id so that an edge shared by two
+    # triangles gives a bit-identical crossing point for both.
+    ea = faces[tri_idx][:, [0, 1, 2]]
+    eb = faces[tri_idx][:, [1, 2, 0]]
+    ea, eb = np.minimum(ea, eb), np.maximum(ea, eb)
+    da = verts[ea, axis] - values[plane_idx, np.newaxis]
+    db = verts[eb, axis] - values[plane_idx, np.newaxis]
+    if HAS_NUMBA:
+        return _numba_slice_triangles(verts, ea, eb, da, db), plane_idx
+    crossed = (da >= 0) != (db >= 0)  # Exactly two per straddling triangle.
+    rows, cols = np.nonzero(crossed)
+    ea = ea[rows, cols]
+    eb = eb[rows, cols]
+    t = (da[rows, cols] / (da[rows, cols] - db[rows, cols]))[:, np.newaxis]
+    points = verts[ea] + (t * (verts[eb] - verts[ea]))
+    return points.reshape(-1, 2, 3), plane_idx
+
+
+def join_segments(segments, tol=0.0001):
+    """ Chain unordered SEGMENTS (Nx2x3) into polylines, returned as a list of
+        vertex arrays.  Closed loops do not repeat their first vertex.
+        
+        Endpoints within TOL of each other are treated as the same point.
+    """
+    segments = np.asarray(segments)
+    keys = np.round(segments.reshape(-1, 3) / tol).astype(np.int64)
+    _, idx, nodes = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    points = segments.reshape(-1, 3)[idx]
+    nodes = nodes.reshape(-1, 2)
+    nodes = nodes[nodes[:, 0] != nodes[:, 1]]  # Degenerate segments.
+    if len(nodes) == 0:
+        return []
+    if HAS_NUMBA:
+        order, lengths = _numba_chain_nodes(nodes, len(points))
+    else:
+        order, lengths = chain_nodes(nodes, len(points))
+    return np.split(points[order], np.cumsum(lengths)[:-1])
+
+
+def chain_nodes(edges, n_nodes):
+    """ Walk graph of EDGES (Nx2 node ids) into chains of nodes.
+        
+        Returns the concatenated node order and the length of each chain.
+        Open chains are started from their ends; nodes shared by more than
+        two edges only keep their first two neighbors.
+        
+        Written in plain loops so it can also be compiled by numba.
+    """
+    nbr = np.full((n_nodes, 2), -1, dtype=np.int64)
+    degree = np.zeros(n_nodes, dtype=np.int64)
+    for k in range(edges.shape[0]):
+        a = edges[k, 0]
+        b = edges[k, 1]
+        if degree[a] < 2:
+            nbr[a, degree[a]] = b
+        if degree[b] < 2:
+            nbr[b, degree[b]] = a
+        degree[a] += 1
+        degree[b] += 1
+    visited = np.zeros(n_nodes, dtype=np.bool_)
+    order = np.empty(n_nodes, dtype=np.int64)
+    lengths = np.empty(n_nodes, dtype=np.int64)
+    n = 0
+    m = 0
+    starts = np.concatenate((np.flatnonzero(degree == 1), np.arange(n_nodes)))
+    for start in starts:
+        if visited[start] or (degree[start] == 0):
+            continue
+        prev = -1
+        cur = start
+        length = 0
+        while (cur != -1) and (not visited[cur]):
+            visited[cur] = True
+            order[n] = cur
+            n += 1
+            length += 1
+            nxt = nbr[cur, 0] if nbr[cur, 0] != prev else nbr[cur, 1]
+            prev = cur
+            cur = nxt
+        lengths[m] = length
+        m += 1
+    return order[:n], lengths[:m]
+
+
+if HAS_NUMBA:
+    # Case table for the crossing pattern (bit e set if edge e is cut by the
+    # plane) -> the two cut edges.  Only patterns with two bits set occur.
+    SLICE_CASES = np.array([[-1, -1], [-1, -1], [-1, -1], [0, 1], [-1, -1], [0, 2], [1, 2], [-1, -1]], dtype=np.int64)
+
+    @njit(parallel=True, cache=True)
+    def _numba_slice_triangles(verts, ea, eb, da, db):
+        """ Crossing points of each straddling triangle's two cut edges.
+            See slice_triangles() for the inputs (Mx3 edge arrays).
+        """
+        m = ea.shape[0]
+        segments = np.empty((m, 2, 3))
+        for k in prange(m):
+            code = 0
+            for e in range(3):
+                code |= np.int64((da[k, e] >= 0) != (db[k, e] >= 0)) << e
+            for j in range(2):
+                e = SLICE_CASES[code, j]
+                a = ea[k, e]
+                b = eb[k, e]
+                t = da[k, e] / (da[k, e] - db[k, e])
+                for c in range(3):
+                    segments[k, j, c] = verts[a, c] + (t * (verts[b, c] - verts[a, c]))
+        return segments
+
+    _numba_chain_nodes = njit(cache=True)(chain_nodes)
+
+
+# Side faces joining rect corners (a, b, c, d) to the next rect's (+4).
+RECT_SIDES = np.array([ [0, 1, 5, 4],
+                        [3, 0, 4, 7],
+                        [2, 3, 7, 6],
+                        [2, 1, 5, 6], ], dtype=np.int32)
 
 
 def rects2mesh(bounds, scale=np.ones(3)):
@@ -149,20 +409,17 @@ def rects2mesh(bounds, scale=np.ones(3)):
     coords = np.vstack([ bounds[0, :] + np.array([-0.5, 0, 0, 0, 0]),
                          bounds,
                          bounds[-1, :] + np.array([0.5, 0, 0, 0, 0]) ])
-    # 4 corners of rect
-    verts = np.array([ c for i in range(n) for c in [ 
-                        coords[i, [0, 1, 3]], # a
-                        coords[i, [0, 2, 3]], # b
-                        coords[i, [0, 2, 4]], # c
-                        coords[i, [0, 1, 4]], # d
-                      ]])
+    # 4 corners of rect, gathered for all rects at once.
+    verts = coords[:, [[0, 1, 3],   # a
+                       [0, 2, 3],   # b
+                       [0, 2, 4],   # c
+                       [0, 1, 4]]   # d
+                  ].reshape(-1, 3)
     verts *= scale
     
-    cube = np.array([  [0, 1, 5, 4],
-                       [3, 0, 4, 7],
-                       [2, 3, 7, 6],
-                       [2, 1, 5, 6], ])
-    faces = np.tile(cube, (n-1, 1, 1))
-    faces += np.arange(n-1).reshape(n-1, 1, 1) * 4
-    faces = np.vstack((np.vstack(faces), [0, 1, 2, 3], [n*4 - 4, n*4 - 3, n*4 - 2, n*4 - 1]))
+    # Side faces between consecutive rects, then the two caps.
+    faces = np.empty(((n-1) * 4 + 2, 4), dtype=np.int32)
+    faces[:-2].reshape(n-1, 4, 4)[...] = RECT_SIDES + (np.arange(n-1, dtype=np.int32).reshape(n-1, 1, 1) * 4)
+    faces[-2] = [0, 1, 2, 3]
+    faces[-1] = [n*4 - 4, n*4 - 3, n*4 - 2, n*4 - 1]
     return Mesh([verts, faces])
\ No newline at end of file
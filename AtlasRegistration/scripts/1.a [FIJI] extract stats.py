@@ -12,6 +12,8 @@ ROOT_DIR = r'<<FILEPATH_TO_DATA>>'
 import os
 import re
 import sys
+from bisect import bisect_left
+from bisect import bisect_right
 from ij import IJ
 
 sys.path.insert(0, PKG_PATH)
@@ -41,6 +43,15 @@ saturated2 = .005  # %
 # Upper-left corner ROI for sampling slide background levels.
 roi_dims = (0, 0, 500, 500)  # px
 
+def hist_bounds(cum, threshold):
+    """ First/last histogram bins at which the count summed from the low/high
+        end exceeds THRESHOLD, from cumulative histogram CUM.
+    """
+    n = len(cum)
+    lo = min(bisect_right(cum, threshold), n - 1)
+    hi = min(bisect_left(cum, cum[-1] - threshold), n - 1)
+    return lo, hi
+
 # Main routine.
 def get_minmax_stats(f=None, rrjd_id=''):
     if not f: return
@@ -69,37 +80,21 @@ def get_minmax_stats(f=None, rrjd_id=''):
             histogram = stats.histogram16
         else:
             histogram = stats.histogram()
-        hsize = len(histogram)
-
-        # THRESHOLD 1        
-        threshold1 = int(stats.pixelCount * max([0.0, saturated1]) / 200.0)
         
+        # Cumulative histogram, built once and searched for both thresholds.
+        cum = []
         count = 0
-        for hmin1 in range(hsize):
-            count += histogram[hmin1]
-            if count > threshold1:
-                break
+        for n in histogram:
+            count += n
+            cum.append(count)
+        
+        # THRESHOLD 1
+        threshold1 = int(stats.pixelCount * max([0.0, saturated1]) / 200.0)
+        hmin1, hmax1 = hist_bounds(cum, threshold1)
         
-        count = 0
-        for hmax1 in range(hsize)[::-1]:
-            count += histogram[hmax1]
-            if count > threshold1:
-                break
-
         # THRESHOLD 2
         threshold2 = int(stats.pixelCount * max([0.0, saturated2]) / 200.0)
-        
-        count = 0
-        for hmin2 in range(hsize):
-            count += histogram[hmin2]
-            if count > threshold2:
-                break
-        
-        count = 0
-        for hmax2 in range(hsize)[::-1]:
-            count += histogram[hmax2]
-            if count > threshold2:
-                break        
+        hmin2, hmax2 = hist_bounds(cum, threshold2)
         
         # Whole image stats.
         row += ['%0.2f' % stats.mean, '%0.2f' % stats.min, '%0.2f' % stats.max]
@@ -128,12 +123,11 @@ for c in range(nc):
     for m in label_tmp:
         label_row += ['C%d_%s' % (c+1, m)]
 
-# Build output and write. No pandas in FIJI :(
-out = ','.join(label_row) + '\n'
-for row in rows:
-    out += ','.join(row) + '\n'
+# Write output row by row. No pandas in FIJI :(
 f = open(CSV_PATH, 'w')
-f.write(out)
+f.write(','.join(label_row) + '\n')
+for row in rows:
+    f.write(','.join(row) + '\n')
 f.close()
 logmsg('Done grabbing stats.')
 
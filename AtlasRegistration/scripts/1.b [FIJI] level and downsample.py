@@ -15,6 +15,7 @@ import csv
 import math
 import sys
 from ij import IJ
+from ij import ImageStack
 from ij.process import LUT
 from java.awt import Color
 from ij.process import StackConverter
@@ -77,7 +78,8 @@ def level_and_scale_image(source_folder=None, f=None, max_val_ch2=None, scale_fa
     # Used to adjust LUT of low-mag RGB output.
     max_vals = (max_val_ch1, max_val_ch2)
     
-    id = stats[f]['id']
+    f_stats = stats[f]
+    id = f_stats['id']
     
     # Open image.
     source_path = os.path.join(source_folder, f)
@@ -86,28 +88,26 @@ def level_and_scale_image(source_folder=None, f=None, max_val_ch2=None, scale_fa
     stack = imp.getStack()
     nc = imp.getNChannels()
     
-    # Adjust range.
+    # Adjust range.  Converted channels go into a fresh stack that replaces the
+    # original in one go (no need to duplicate the whole image afterwards).
+    new_stack = ImageStack(imp.getWidth(), imp.getHeight())
     for c in range(nc):
         sidx = imp.getStackIndex(c+1, 1, 1)
+        roi_mean = f_stats['C%d_roi_mean' % (c+1)]
+        mean = f_stats['C%d_mean' % (c+1)]
         fp = stack.getProcessor(sidx).convertToFloat()
-        fp.multiply(1. / stats[f]['C%d_roi_mean' % (c+1)])
-        fp.subtract(stats[f]['C%d_mean' % (c+1)] / stats[f]['C%d_roi_mean' % (c+1)])
-        fp.subtract(levels[id][c]['adj_min'])
+        fp.multiply(1. / roi_mean)
+        fp.subtract((mean / roi_mean) + levels[id][c]['adj_min'])  # Both offsets in one pass.
         fp.multiply(levels[id][c]['sf'])
         if max_val == 65535:
-            stack.setProcessor(fp.convertToShort(False), sidx)
+            ip = fp.convertToShort(False)
         elif max_val == 255:
-            stack.setProcessor(fp.convertToByte(False), sidx)
+            ip = fp.convertToByte(False)
         else:
             raise
-        
-        stack.getProcessor(sidx).setMinAndMax(0, max_val)  # Not sure this is needed but playing it safe.
-    
-    """ This next line is SUPER DUMB, but if I don't do this, it seems like some memory error causes the operations
-        in the following loop to revert Channel #0 (but not #1??!?) to its original status before the math operations
-        above... SUPER WEIRD, need to post on the ImageJ forum about it...
-    """
-    imp = imp.duplicate()  # <-- THIS IS SUPER DUMB
+        ip.setMinAndMax(0, max_val)  # Not sure this is needed but playing it safe.
+        new_stack.addSlice(stack.getSliceLabel(sidx), ip)
+    imp.setStack(new_stack, nc, 1, 1)
     stack = imp.getStack()
     for c in range(stack.getSize()):
         imp.setC(c+1)
@@ -18,11 +18,13 @@ PKG_PATH = r'<<FILEPATH_TO_SCRIPTS>>'
 # 2021.04.25 -- Need to switch to new mask_patch() method eventually...
 
 # Imports
+import csv
 import math
 import os
 import re
 import sys
 import time
+from itertools import chain
 from ij import IJ
 from ij.io import DirectoryChooser
 from ij.gui import GenericDialog
@@ -41,7 +43,9 @@ from mpicbg.trakem2.align import RegularizedAffineLayerAlignment
 
 sys.path.insert(0, PKG_PATH)
 BASECAL_TABLE = {'Unknown': 1.0}
+BASECAL_TABLE_REV = {v: k for k, v in BASECAL_TABLE.items()}  # Calibration -> preset name (table is frozen).
 from rothetal_pkg.fiji.calibration import get_embedded_cal
+from rothetal_pkg.fiji.multithread import multi_task
 from rothetal_pkg.fiji.utils import logmsg
 from rothetal_pkg.fiji import t2
 import rothetal_pkg.fiji.t2.canvas
@@ -49,6 +53,10 @@ import rothetal_pkg.fiji.t2.displayable
 import rothetal_pkg.fiji.t2.layer
 import rothetal_pkg.fiji.t2.patch
 
+# Sorted dialog choices for (frozen) preset tables.
+BASECAL_KEYS = sorted(BASECAL_TABLE.keys())
+IFILTER_KEYS = sorted(t2.IFILTERS.keys())
+
 
 # Establish some 'global' defaults.
 opts = lambda:0  # Black magic.
@@ -71,6 +79,7 @@ opts.append_lock_montage = False
 opts.append_lock_layers = False
 opts.lowmag_model_index = 0
 opts.n_mipmap_threads = Runtime.getRuntime().availableProcessors()  # Max out cores.
+opts.n_montage_threads = 1  # Layers montaged concurrently (SIFT is already multithreaded per layer).
 opts.relative_scale_tolerance = 0.05  # Allow 5% difference?
 
 # Regular expression patterns.
@@ -84,6 +93,31 @@ param_montage = t2.init_param_montage('Similarity', False, 64, 1024)
 param_layer = t2.init_param_layer('Rigid', False, 16, 256)
 param_layer.ppm.sift.fdSize = 8
 
+# Combined filter arrays, keyed by (filter name, default min/max flag).
+FILTER_CACHE = {}
+
+
+def build_filter(key):
+    """ Return filter array for image filter KEY, prefixed with 'Default Min/Max'
+        if that option is selected.
+    """
+    k = (key, opts.ifilter_defminmax)
+    if k not in FILTER_CACHE:
+        filter_ = t2.IFILTERS[key]
+        if opts.ifilter_defminmax:
+            if filter_ is None:
+                filter_ = t2.IFILTERS['Default Min/Max']
+            else:
+                filter_ = t2.IFILTERS['Default Min/Max'] + filter_
+        FILTER_CACHE[k] = filter_
+    return FILTER_CACHE[k]
+
+
+def any_pending(fu_layer):
+    """ Test if any futures in a dict of future lists (one layer of fu_dict) are unfinished.
+    """
+    return any(not f.isDone() for sublist in fu_layer.itervalues() for f in sublist)
+
 
 def manual_position_dlg(layerlist):
     """ Build interactive dialog for manually positioning patches in layerlist
@@ -218,8 +252,9 @@ def manual_position_dlg(layerlist):
     def build_layer_chooser():
         choice_layer_chooser.removeAll()
         choice_layer_chooser.add('             - select - ')
+        pw = layerset.getCalibrationCopy().pixelWidth
         for layer in dlg_opts.chooserlist:
-            choice_layer_chooser.add('%s (z=%0.1f)' % (layer.getTitle(), layer.getZ()*layerset.getCalibrationCopy().pixelWidth))
+            choice_layer_chooser.add('%s (z=%0.1f)' % (layer.getTitle(), layer.getZ()*pw))
         choice_layer_chooser.select(0)
     
     # Build dialog.
@@ -292,27 +327,46 @@ def manual_position_dlg(layerlist):
         return t2.displayable.sort_by_z(dlg_opts.montagelist), True
 
 
-def montage_task(layerlist, tilesinplace=False, fu_dict={}, lowmag=None, exclude_layers=[]):
+def montage_task(layerlist, tilesinplace=False, fu_dict={}, lowmag=None, exclude_layers=[], ecal_map=None):
     """ Routine for montaging patches in layerlist.
+        ECAL_MAP is an optional dict of patch -> embedded calibration.
     """
     
     if not layerlist:
         return  # Nothing to montage.
     project = layerlist[0].getProject()
     cal = layerlist[0].getParent().getCalibrationCopy()
-    filter_ = t2.IFILTERS[opts.ifilter_montage]
-    if opts.ifilter_defminmax:
-        if filter_ is None:
-            filter_ = t2.IFILTERS['Default Min/Max']
-        else:
-            filter_ = t2.IFILTERS['Default Min/Max'] + filter_
+    # Patches in each layer (montaging only moves patches, so this holds for the whole task).
+    displ = {layer: list(layer.getDisplayables(Patch)) for layer in layerlist}
+    # Z of each layer, for sorting.
+    z_of = {layer: layer.getZ() for layer in layerlist}
+    
+    def montage_layer(layer, fu_layer, params, desc):
+        """ Sub-method to allow for multithreading.
+            Waits for mipmaps of LAYER (FU_LAYER is a dict of future lists), 
+            then montages it with its own copy of PARAMS.
+        """
+        title = layer.getTitle().encode('utf-8')
+        if any_pending(fu_layer):
+            logmsg('Waiting for %s MipMaps in layer %s to update...' % (desc, title), False)
+            Utils.waitIfAlive(list(chain.from_iterable(fu_layer.itervalues())), False)  # Wait until mipmaps are done.
+        logmsg('Montaging %s in layer %s using %s ...' % (desc, title, t2.MODEL_STRINGS[params.desiredModelIndex]), False)
+        b = Bureaucrat.createAndStart(t2.MontageLayerWorker('mw', params=params, layer=layer, tilesAreInPlaceIn=tilesinplace), project)
+        b.join()  # Wait for thread to finish.
+    
+    if ecal_map is None:
+        # Look up embedded calibration once per patch.
+        unit = cal.getUnit()
+        ecal_map = {patch: get_embedded_cal(patch, unit) for layer in layerlist 
+                                                         for patch in displ[layer]}
+    filter_ = build_filter(opts.ifilter_montage)
     # Create list of lowmag layers to work on.
     lowmag_layerlist = list(set(layerlist).difference(exclude_layers))
     # List of patches that will be locked/unlocked.
     lowmag_unlocked_patches = []
     # List of currently visible patches that will be temporarily hidden.
     visible_patches = [patch for layer in layerlist 
-                             for patch in layer.getDisplayables(Patch)
+                             for patch in displ[layer]
                              if patch.isVisible()]
     if lowmag and lowmag_layerlist:
         # Save default values for montage parameters.
@@ -323,36 +377,33 @@ def montage_task(layerlist, tilesinplace=False, fu_dict={}, lowmag=None, exclude
         param_montage.desiredModelIndex = opts.lowmag_model_index
         t2.patch.toggle_visibility(visible_patches, False)  # Hide all patches.
         
-        # Remove any layers that do not have lowmag items.
-        lowmag_layerlist[:] = [layer for layer in lowmag_layerlist
-                               if any([get_embedded_cal(patch, cal.getUnit()) == lowmag
-                                       for patch in layer.getDisplayables(Patch)])]
+        # Collect lowmag patches per layer, and remove any layers that do not have lowmag items.
+        lowmag_patches = {layer: [patch for patch in displ[layer]
+                                        if ecal_map[patch] == lowmag]
+                          for layer in lowmag_layerlist}
+        lowmag_layerlist[:] = [layer for layer in lowmag_layerlist if lowmag_patches[layer]]
+        all_lowmag_patches = list(chain.from_iterable(lowmag_patches[layer] for layer in lowmag_layerlist))
+        lowmag_unlocked_patches += [patch for patch in all_lowmag_patches if not patch.isLocked()]
+        t2.patch.toggle_visibility(all_lowmag_patches, True)  # Show only lowmag patches.
         
-        # Apply filters to patches layerwise.
+        # Apply filters to patches layerwise (futures are kept per layer so montaging can start early).
         for layer in lowmag_layerlist:
             if layer not in fu_dict:
                 fu_dict[layer] = {}  # Necessary?
             if lowmag not in fu_dict[layer]:
                 fu_dict[layer][lowmag] = []  # Necessary?
-            patches = [patch for patch in layer.getDisplayables(Patch)
-                             if get_embedded_cal(patch, cal.getUnit()) == lowmag]
-            #if len(patches) < 2:
+            #if len(lowmag_patches[layer]) < 2:
             #    lowmag_layerlist.remove(layer)  # Not enough lowmags to montage.
             #    continue  # Skip to next layer.
-            lowmag_unlocked_patches += [patch for patch in patches if not patch.isLocked()]
-            t2.patch.toggle_visibility(patches, True)  # Show only lowmag patches.
-            fu_dict[layer][lowmag] += t2.patch.set_filters(patches, filter_)
+            fu_dict[layer][lowmag] += t2.patch.set_filters(lowmag_patches[layer], filter_)
         
         # Montage lowmags layer-wise, allows for concurrent mipmap threads to run in background.
-        n = len(lowmag_layerlist)
-        for i,layer in enumerate(sorted(lowmag_layerlist, key=lambda x: x.getZ())):
-            if not t2.are_all_done(fu_dict[layer][lowmag]):
-                logmsg('Waiting for lowmag MipMaps in layer %s to update...' % layer.getTitle().encode('utf-8'), False)
-                Utils.waitIfAlive(fu_dict[layer][lowmag], False)  # Wait until mipmaps are done.
-            logmsg('Montaging lowmags in layer %s using %s [%d/%d] ...' % (layer.getTitle().encode('utf-8'), t2.MODEL_STRINGS[param_montage.desiredModelIndex], i+1, n), False)
-            if len(layer.getDisplayables(Patch)) > 1:  # Don't montage if only one item..
-                b = Bureaucrat.createAndStart(t2.MontageLayerWorker('mw', params=param_montage, layer=layer, tilesAreInPlaceIn=tilesinplace), project)
-                b.join()  # Wait for thread to finish.
+        # Each task gets its own copy of the (temporarily modified) montage parameters.
+        args = [(layer, {lowmag: fu_dict[layer][lowmag]}, param_montage.clone(), 'lowmag')
+                for layer in sorted(lowmag_layerlist, key=z_of.__getitem__)
+                if len(displ[layer]) > 1]  # Don't montage if only one item..
+        if args:
+            multi_task(montage_layer, args, n_threads=opts.n_montage_threads)
         
         t2.patch.toggle_lock(lowmag_unlocked_patches, True, False)  # Lock any unlocked lowmag patches.
         # Restore params.
@@ -366,21 +417,17 @@ def montage_task(layerlist, tilesinplace=False, fu_dict={}, lowmag=None, exclude
         if layer not in fu_dict:
             fu_dict[layer] = {}  # Necessary?
         # Not necessary to add to correct 'calibration' key at this point, so just use dummy key.
-        fu_dict[layer]['x'] = t2.patch.set_filters(layer.getDisplayables(Patch), filter_)
+        fu_dict[layer]['x'] = t2.patch.set_filters(displ[layer], filter_)
     
     # Montage layer-wise, allows for concurrent mipmap threads to run in background.
-    n = len(layerlist)
-    for i,layer in enumerate(sorted(layerlist, key=lambda x: x.getZ())):
-        futures = [item for sublist in fu_dict[layer].values() for item in sublist]
-        if not t2.are_all_done(futures):
-            logmsg('Waiting for MipMaps to in layer %s to update...' % layer.getTitle().encode('utf-8'), False)
-            Utils.waitIfAlive(futures, False)
-        if len(layer.getDisplayables(Patch)) > 1 and not t2.patch.are_all_locked([layer])[0]:
-            logmsg('Montaging images in layer %s using %s [%d/%d] ...' % (layer.getTitle().encode('utf-8'), t2.MODEL_STRINGS[param_montage.desiredModelIndex], i+1, n), False)
-            b = Bureaucrat.createAndStart(t2.MontageLayerWorker('mw', params=param_montage, layer=layer, tilesAreInPlaceIn=tilesinplace), project)
-            b.join()  # Wait for thread to finish.
+    args = []
+    for layer in sorted(layerlist, key=z_of.__getitem__):
+        if len(displ[layer]) > 1 and not t2.patch.are_all_locked(displ[layer])[0]:
+            args.append((layer, fu_dict[layer], param_montage.clone(), 'images'))
         else:
             logmsg('No futher images to montage in layer %s...' % layer.getTitle().encode('utf-8'), False)
+    if args:
+        multi_task(montage_layer, args, n_threads=opts.n_montage_threads)
             
     # Unlock any lowmag items we locked above (excluding those locked by user).
     t2.patch.toggle_lock(lowmag_unlocked_patches, False)
@@ -406,10 +453,9 @@ def montage_patches(layerset, layerlist, folder, projname, fu_dict={}, existing_
             return None
         elif save_and_quit:  # Save for resuming later.
             # Wait for mipmaps to finish for validation.
-            futures = [item for layerlist_ in fu_dict.values() for sublist in layerlist_.values() for item in sublist]
-            if not t2.are_all_done(futures):
+            if any(any_pending(fu_layer) for fu_layer in fu_dict.itervalues()):
                 IJ.showMessage('Waiting for MipMaps to finish before saving...')
-                Utils.waitIfAlive(futures, False)
+                Utils.waitIfAlive(list(chain.from_iterable(chain.from_iterable(d.itervalues() for d in fu_dict.itervalues()))), False)
             if not project.getLoader().getProjectXMLPath(): # not saved yet, need to save
                 project.saveAs(os.path.join(folder, projname + '.xml'), False)
             else:
@@ -443,13 +489,15 @@ def montage_patches(layerset, layerlist, folder, projname, fu_dict={}, existing_
             
     # Get lowest magnification (highest cal) in project.  Images at this mag
     # will first be montaged using a Translation model.
-    lowmag = max([get_embedded_cal(patch, cal.getUnit()) for patch in layerset.getDisplayables(Patch)])
+    unit = cal.getUnit()
+    ecal_map = {patch: get_embedded_cal(patch, unit) for patch in layerset.getDisplayables(Patch)}
+    lowmag = max(ecal_map.values())
     if opts.append_lock_montage:
         # When appending, locked patches don't play well with the translation 
         # transform.  Ergo, only attempt lowmag montage on newly created layers.
-        montage_task(layerlist, tilesinplace, fu_dict, lowmag, existing_layers)
+        montage_task(layerlist, tilesinplace, fu_dict, lowmag, existing_layers, ecal_map)
     else:
-        montage_task(layerlist, tilesinplace, fu_dict, lowmag)
+        montage_task(layerlist, tilesinplace, fu_dict, lowmag, ecal_map=ecal_map)
     
     # Check if any newly added (unlocked) patches drastically differ in their relative scale
     # from existing (locked) patches.  Because of the locked pages, the layer will not be normalized.
@@ -459,22 +507,28 @@ def montage_patches(layerset, layerlist, folder, projname, fu_dict={}, existing_
     if opts.append_lock_montage:
         for layer in layerlist:
             scale_list = []
-            visible_patches = [patch for patch in layer.getDisplayables(Patch) if patch.isVisible()]
-            locked_patches = [patch for patch in visible_patches if patch.isLocked()]
+            # Split visible patches into locked/unlocked in a single pass.
+            locked_patches = []
+            unlocked_patches = []
+            for patch in layer.getDisplayables(Patch):
+                if not patch.isVisible():
+                    continue
+                if patch.isLocked():
+                    locked_patches.append(patch)
+                else:
+                    unlocked_patches.append(patch)
             if not locked_patches:  # No locked patches in this layer, irrelevant.
                 continue
-            unlocked_patches = [patch for patch in visible_patches if not patch.isLocked()]
-            locked_scale = [t2.displayable.get_relative_scale(patch) for patch in locked_patches]
+            locked_scale = t2.displayable.get_relative_scales(locked_patches)
             locked_scale = sum(locked_scale) / len(locked_scale)
-            for patch in unlocked_patches:
-                diff = t2.displayable.get_relative_scale(patch) / locked_scale
+            for patch, ps in zip(unlocked_patches, t2.displayable.get_relative_scales(unlocked_patches)):
+                diff = ps / locked_scale
                 if abs(1.0 - diff) > opts.relative_scale_tolerance:  # Only adjust if difference is greater than set amount (default: 5%).
-                    scale_list.append([patch.getTitle(), 1.0/diff])
+                    scale_list.append('%s was scaled by %0.4f.' % (patch.getTitle(), 1.0/diff))
                     t2.patch.scale([patch], 1.0/diff, xo=0.0, yo=0.0, vd=False, linked=False)
             if scale_list:
-                logmsg('The following patches in layer %s (z=%0.1f) were resized to match existing relative scaling:' % (layer.getTitle().encode('utf-8'), layer.getZ()*cal.pixelWidth))
-                for pt,sc in scale_list:
-                    logmsg('%s was scaled by %0.4f.' % (pt,sc))
+                logmsg('\n'.join(['The following patches in layer %s (z=%0.1f) were resized to match existing relative scaling:' % (layer.getTitle().encode('utf-8'), layer.getZ()*cal.pixelWidth)] +
+                                  scale_list))
 
     t2.canvas.reset(layerset, zoomout=True, resize=True)
     return layerlist  # In case new layers were created.
@@ -487,17 +541,13 @@ def load_patches(layerset, filelist, z_map=None):
     logmsg('Loading new patches...', False)
     project = layerset.getProject()
     cal = layerset.getCalibrationCopy()
-    filter_ = t2.IFILTERS[opts.ifilter_montage]
-    if opts.ifilter_defminmax:
-        if filter_ is None:
-            filter_ = t2.IFILTERS['Default Min/Max']
-        else:
-            filter_ = t2.IFILTERS['Default Min/Max'] + filter_
+    filter_ = build_filter(opts.ifilter_montage)
     section_thickness = cal.pixelDepth / cal.pixelWidth
     mask_params = None
     fu_dict = {}  # Convoluted futures list broken down by mag and layer.
                   # Theoretically speeds things up down the line..?
     layerlist = set()  # List of layers that have been added.
+    filter_groups = {}  # New patches grouped by (layer, ecal), for applying filters in batches.
     # Load patches into respective layers based on section num.
     # Wrap in a "try" in case user cancels during interactive masking.
     try:
@@ -524,20 +574,16 @@ def load_patches(layerset, filelist, z_map=None):
                 ecal = get_embedded_cal(patch, cal.getUnit(), True)
                 rescale = ecal / cal.pixelWidth  # Relative scaling of patch.
                 patch.scale(rescale, rescale, 0.0, 0.0)
-                if layer not in fu_dict:
-                    fu_dict[layer] = {}
-                if ecal not in fu_dict[layer]:
-                    fu_dict[layer][ecal] = []
-                fu_dict[layer][ecal] += t2.patch.set_filters([patch], filter_)  # Apply montage filter now.
-                # Mask central object in patch.
-                # Wrapped in try because we need to recreate buckets even if canceled.
-                try:
-                    if opts.mask_central: ####
-                        logmsg('Masking option not enabled for this version of script, sorry!', show=True)
-                finally:
-                    layer.recreateBuckets()
-                    #IJ.showMessage(layer.getTitle())
+                filter_groups.setdefault((layer, ecal), []).append(patch)
                 layerlist.add(layer)  # Add layer to list of layers to process.
+                # Mask central object in patch.
+                # Buckets for every layer are recreated once below (even if canceled).
+                if opts.mask_central: ####
+                    logmsg('Masking option not enabled for this version of script, sorry!', show=True)
+        
+        # Apply montage filter now, one batch per layer & mag.
+        for (layer, ecal), patches in filter_groups.iteritems():
+            fu_dict.setdefault(layer, {}).setdefault(ecal, []).extend(t2.patch.set_filters(patches, filter_))
     
         layerlist = list(layerlist)  # Returns list w/o dupes.
         t2.patch.sort_by_mag(layerlist)
@@ -547,7 +593,7 @@ def load_patches(layerset, filelist, z_map=None):
         layerlist = None  # Results in canceling out after return.
 
     finally:
-        layerset.recreateBuckets(True)
+        layerset.recreateBuckets(True)  # Also recreates buckets of each layer.
         project.getLayerTree().updateList(layerset)
         Display.updateLayerScroller(layerset)
     return layerlist, fu_dict
@@ -609,15 +655,14 @@ def start_project(folder, project, projname, filelist, layerlist=[], z_map=None)
         new_layerlist, fu_dict = load_patches(layerset, filelist, z_map)
         if new_layerlist is None:
             return  # Allows for cancelling out/stopping at this stage.
-        layerlist = list(set(layerlist + new_layerlist))  # Get rid of potential duplicates.
+        layerlist = list(set(layerlist).union(new_layerlist))  # Get rid of potential duplicates.
     else:
         fu_dict = {}
         pass
     
     # Unlink and apply locks as needed.  [NEW, MOVED]
     for layer in layerlist:
-        for patch in layer.getDisplayables(Patch):
-            patch.unlink()
+        t2.displayable.unlink([patch for patch in layer.getDisplayables(Patch) if patch.isLinked()])
     
     # Montage patches within each layer.
     layerlist = montage_patches(layerset, layerlist, folder, projname, fu_dict, existing_layers)
@@ -632,16 +677,11 @@ def start_project(folder, project, projname, filelist, layerlist=[], z_map=None)
         t2.patch.toggle_lock(layerset.getLayers(), False)
             
     # Perform layer-wise alignments.
-    if any([opts.silent_do_rigid, opts.silent_do_affine]) and len(layerset.getLayers()) > 1:
+    if (opts.silent_do_rigid or opts.silent_do_affine) and len(layerset.getLayers()) > 1:
         ## TODO: Can SIFT parameters be optimized based on overall canvas size??
         
         # Set everything to the montage filter.. assume better results?
-        filter_ = t2.IFILTERS[opts.ifilter_montage]
-        if opts.ifilter_defminmax:
-            if filter_ is None:
-                filter_ = t2.IFILTERS['Default Min/Max']
-            else:
-                filter_ = t2.IFILTERS['Default Min/Max'] + filter_
+        filter_ = build_filter(opts.ifilter_montage)
         futures = t2.patch.set_filters(layerset.getDisplayables(Patch), filter_)
         if futures:
             logmsg('Waiting for MipMaps to update...', False)
@@ -680,12 +720,7 @@ def start_project(folder, project, projname, filelist, layerlist=[], z_map=None)
     
     # Restore filters and/or apply selected filter.
     futures = []
-    filter_ = t2.IFILTERS[opts.ifilter]
-    if opts.ifilter_defminmax:
-        if filter_ is None:
-            filter_ = t2.IFILTERS['Default Min/Max']
-        else:
-            filter_ = t2.IFILTERS['Default Min/Max'] + filter_
+    filter_ = build_filter(opts.ifilter)
     logmsg('Applying selected filter [%s] to images...' % opts.ifilter, False)
     #for layer in layerset.getLayers():
     for layer in layerlist:  ## CHANGED FROM LAYERLIST TO LAYERSET.GETLAYERS
@@ -715,13 +750,15 @@ def start_project(folder, project, projname, filelist, layerlist=[], z_map=None)
     # But only checking layers that were currently processed...
     scale_check = []
     for layer in layerlist:
-        for patch in layer.getDisplayables(Patch):
-            ps = t2.displayable.get_relative_scale(patch)
+        title = layer.getTitle().encode('utf-8')
+        z = layer.getZ() * cal.pixelWidth
+        patches = layer.getDisplayables(Patch)
+        for patch, ps in zip(patches, t2.displayable.get_relative_scales(patches)):
             if abs(ps-1.0) > opts.relative_scale_tolerance:
-                scale_check.append('[%0.3f]: %s in layer %s (z=%0.1f)' % (ps, patch.getTitle(), layer.getTitle().encode('utf-8'), layer.getZ()*layerset.getCalibrationCopy().pixelWidth))
+                scale_check.append('[%0.3f]: %s in layer %s (z=%0.1f)' % (ps, patch.getTitle(), title, z))
     if scale_check:
-        logmsg('The following patches appear to be incorrectly scaled relative to project:\n' +
-                     '\n'.join(scale_check), True)
+        logmsg('\n'.join(['The following patches appear to be incorrectly scaled relative to project:'] +
+                          scale_check), True)
     
     # Save project and finish.
     if opts.silent_do_save:
@@ -749,17 +786,17 @@ def build_file_list(folder, project, projname, layerlist=[]):
     # Check for z_map.csv file (hidden patch-2-layer mapping feature that ignores filenames).
     z_map = None
     try:
-        with open(os.path.join(folder, 'z_map.csv'), 'r') as f:
-            z_map = {fname:[int(zval) for zval in zvals.split('|')]
-                     for line in f.read().splitlines() 
-                     for (fname,zvals) in [line.split(',')]
-                     }
+        with open(os.path.join(folder, 'z_map.csv'), 'rb') as f:
+            z_map_ = {}
+            for fname, zvals in csv.reader(f):
+                z_map_[fname] = [int(zval) for zval in zvals.split('|')]
+        z_map = z_map_  # Only use if entire file was parsed.
     except:  # folder is None or file not found.
         pass
     
     filelist = []
     if project:
-        existingfiles = set([patch.getFilePath() for layer in project.getRootLayerSet().getLayers() for patch in layer.getDisplayables(Patch)])
+        existingfiles = set([patch.getFilePath().replace('\\','/') for layer in project.getRootLayerSet().getLayers() for patch in layer.getDisplayables(Patch)])
     
     try:
         logmsg('Searching for TIF images...', False)
@@ -776,8 +813,9 @@ def build_file_list(folder, project, projname, layerlist=[]):
             # Does not work if existing files have been moved to a different location 
             # and the xml wasn't updated..
             if project:
-                newfiles = set([os.path.join(root,filename).replace('\\','/') for filename in filenames]).difference(existingfiles)
-                filenames = [os.path.basename(newfile) for newfile in newfiles] 
+                root_norm = root.replace('\\','/').rstrip('/') + '/'
+                filenames = [filename for filename in filenames
+                             if root_norm + filename not in existingfiles]
             if len(filenames) > 0:
                 filelist.append([root, filenames, offset])
     except TypeError:
@@ -860,28 +898,32 @@ def choose_dir():
     layerlist = []
     choose_dir = True
     
+    # Front display (if any project is open).
+    front = Display.getFront()
+
     # See if there is an open project that can be resumed.
-    if Display.getFront() and os.path.isfile(os.path.join(Display.getFront().getProject().getLoader().getUNUIdFolder(),'resumeproject.new')):
+    if front and os.path.isfile(os.path.join(front.getProject().getLoader().getUNUIdFolder(),'resumeproject.new')):
         dlg = GenericDialog('Resume?')
-        dlg.addMessage('Resume montaging of open project: ' + Display.getFront().getProject().toString() + '?')
+        dlg.addMessage('Resume montaging of open project: ' + front.getProject().toString() + '?')
         dlg.enableYesNoCancel('Resume', 'Nope')
         dlg.hideCancelButton()
         dlg.showDialog()
         if dlg.wasOKed():
-            resume_project(Display.getFront().getProject())
+            resume_project(front.getProject())
             return
 
     # Check if we are working to an open project.
-    if Display.getFront():
-        tmp_layers = Display.getFront().getLayerSet().getLayers()
+    if front:
+        tmp_layers = front.getLayerSet().getLayers()
+        layer_titles = [l.getTitle() for l in tmp_layers]
         dlg = GenericDialog('Existing Project?')
-        dlg.addMessage('A project is already open: %s' % Display.getFront().getProject().getTitle())
+        dlg.addMessage('A project is already open: %s' % front.getProject().getTitle())
         dlg.setInsets(15, 20, 0)
         dlg.addCheckbox('Re-montage existing layers?', False)
         dlg.setInsets(0, 10, 0)
-        dlg.addChoice('First layer:', [l.getTitle() for l in tmp_layers], tmp_layers[0].getTitle())
+        dlg.addChoice('First layer:', layer_titles, layer_titles[0])
         dlg.setInsets(0, 10, 0)
-        dlg.addChoice('Last layer:', [l.getTitle() for l in tmp_layers], tmp_layers[-1].getTitle())
+        dlg.addChoice('Last layer:', layer_titles, layer_titles[-1])
         dlg.setInsets(15, 20, 0)
         dlg.addCheckbox('Add additional images?', True)
         dlg.setInsets(0, 50, 0)
@@ -895,7 +937,7 @@ def choose_dir():
         #dlg.hideCancelButton()
         dlg.showDialog()
         if dlg.wasOKed():  # Yes, we want to work with project.
-            project = Display.getFront().getProject()
+            project = front.getProject()
             layerset = project.getRootLayerSet()
             if dlg.getNextBoolean():
                 layerlist = tmp_layers[dlg.getNextChoiceIndex():dlg.getNextChoiceIndex()+1]
@@ -907,9 +949,9 @@ def choose_dir():
             opts.cal_unit = cal.unit
             # Unable to store cal-table key in layerset properties, because
             # layerset.setProperties() doesn't seem to save w/ XML...
-            cal_desc = [k for k,v in BASECAL_TABLE.items() if v == cal.pixelWidth]
-            if cal_desc:
-                opts.basecal = cal_desc[0]
+            cal_desc = BASECAL_TABLE_REV.get(cal.pixelWidth)
+            if cal_desc is not None:
+                opts.basecal = cal_desc
             else:
                 # Not sure what to do with this yet...
                 logmsg('Unknown project calibration!?', False)
@@ -937,14 +979,14 @@ def choose_dir():
     dlg.setInsets(10, 20, 0)
     dlg.addNumericField('Section thickness:', opts.cal_z, 0, 3, opts.cal_unit)
     dlg.setInsets(10, 20, 0)
-    dlg.addChoice('Base calibration:', sorted(BASECAL_TABLE.keys()), opts.basecal)
+    dlg.addChoice('Base calibration:', BASECAL_KEYS, opts.basecal)
     if project:
         dlg.getNumericFields()[0].setEnabled(False)
         dlg.getChoices()[0].setEnabled(False)
     dlg.setInsets(10, 20, 0)
-    dlg.addChoice('Montaging filter:', sorted(t2.IFILTERS.keys()), opts.ifilter_montage)
+    dlg.addChoice('Montaging filter:', IFILTER_KEYS, opts.ifilter_montage)
     dlg.setInsets(10, 20, 0)
-    dlg.addChoice('Final image filter:', sorted(t2.IFILTERS.keys()), opts.ifilter)
+    dlg.addChoice('Final image filter:', IFILTER_KEYS, opts.ifilter)
     dlg.setInsets(0, 130, 0)
     dlg.addCheckbox('Force default min/max values before filtering?', opts.ifilter_defminmax)
     dlg.setInsets(0, 130, 0)
@@ -1006,8 +1048,9 @@ def choose_dir():
     # Check if there are multiple project folders,
     # but don't do this if appending, won't make sense!
     if project is None:
-        root, dirs, files = os.walk(folder).next()
-        dirs[:] = filter(re_folder_filter, dirs)
+        # Only top-level subfolders are needed, so list them directly instead of walking.
+        root = folder
+        dirs = [d for d in os.listdir(root) if re_folder_filter(d) and os.path.isdir(os.path.join(root, d))]
         if len(dirs) > 0:
             dlg = GenericDialog('Multiple projects?')
             dlg.addMessage('Multiple folders found in root directory.')
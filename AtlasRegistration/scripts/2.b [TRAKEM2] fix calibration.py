@@ -13,17 +13,31 @@ PKG_PATH = r'<<FILEPATH_TO_SCRIPTS>>'
 
 # Imports
 import sys
+from itertools import chain
 from ij.gui import GenericDialog
 from ini.trakem2.display import Display
 from ini.trakem2.display import Patch
 from java.awt.geom import AffineTransform
+from java.util import IdentityHashMap
 
 sys.path.insert(0, PKG_PATH)
 BASECAL_TABLE = {'Unknown': 1.0}
+BASECAL_KEYS = sorted(BASECAL_TABLE.keys())  # Table is frozen.
 from rothetal_pkg.fiji.calibration import convert_units
 from rothetal_pkg.fiji.utils import logmsg
 from rothetal_pkg.fiji.t2.canvas import reset
 
+def get_patch_cal(patch):
+    """ (pixelWidth, unit) of PATCH.  Uses calibration stored with the patch at
+        import when available, only opening the image if it is missing.  Read-only.
+    """
+    c = patch.getProperty('cal')
+    u = patch.getProperty('unit')
+    if c and u:
+        return float(c), u
+    cal = patch.getImagePlus().getCalibration()
+    return cal.pixelWidth, cal.getUnit()
+
 def change_base_calibration():
     # Do we have an open project?
     display = Display.getFront()
@@ -33,17 +47,17 @@ def change_base_calibration():
     layerset = display.getLayerSet()
     patches = layerset.getDisplayables(Patch)
 
-    # Get calibrations for all patches... might take awhile!
-    cals = [patch.getImagePlus().getCalibration() for patch in patches]
-
-    # Get unique calibration values and sort with lowest mag first.
-    unique_cals = sorted(set([(cal.pixelWidth, cal.getUnit()) for cal in cals]), key=lambda x: x[0], reverse=True)
-    unique_patches = [None] * len(unique_cals)
+    # Get calibrations for all patches (might take awhile if images have to be opened!).
+    cals = [get_patch_cal(patch) for patch in patches]
 
     # Find first instance of a patch that matches each unique calibration/mag.
-    for i,ucal in enumerate(unique_cals):
-        idx = [cal.pixelWidth for cal in cals].index(ucal[0])
-        unique_patches[i] = patches[idx]
+    first_patch = {}
+    for cal, patch in zip(cals, patches):
+        first_patch.setdefault(cal, patch)
+
+    # Get unique calibration values and sort with lowest mag first.
+    unique_cals = sorted(first_patch.keys(), key=lambda x: x[0], reverse=True)
+    unique_patches = [first_patch[ucal] for ucal in unique_cals]
 
     # Sanity check: convert all calibration values to microns if they aren't already.
     for i,ucal in enumerate(unique_cals):
@@ -51,7 +65,7 @@ def change_base_calibration():
 
     # Create list for dialog.
     cal_list = ['%0.4f um/px  [ %s ]' % (ucal[0], upatch.getTitle()) for ucal, upatch in zip(unique_cals, unique_patches)]
-    cal_list += sorted(BASECAL_TABLE.keys())
+    cal_list += BASECAL_KEYS
 
     # Present user with dialog to select new calibration.
     dlg = GenericDialog('Change base calibration')
@@ -75,9 +89,11 @@ def change_base_calibration():
     cal.pixelHeight = new_pw
     at = AffineTransform()
     at.scale(sf, sf)
-    # Scale all objects in project to new calibration.
-    for d in set(layerset.getDisplayables() + layerset.getZDisplayables()):
-        d.preTransform(at, False)
+    # Scale all objects in project to new calibration (each only once, compared by identity on the Java side).
+    seen = IdentityHashMap()
+    for d in chain(layerset.getDisplayables(), layerset.getZDisplayables()):
+        if seen.put(d, True) is None:
+            d.preTransform(at, False)
     # Scale all layer thicknesses to new calibration.
     for layer in layerset.getLayers():
         layer.setZ(layer.getZ() * sf)
@@ -32,6 +32,7 @@ PKG_PATH = r'<<FILEPATH_TO_SCRIPTS>>'
 ##@ Integer (label="Background value:", value=255, persist=true) background_val
 
 n_threads = 16  # For multithreading layer extraction.
+n_patch_threads = 1  # For multithreading patch extraction within each layer (1 = sequential).
 
 #ii = 8 # FOR HI-RES CASES 2-4 -- limited memory issue
 
@@ -63,6 +64,7 @@ if force_rgb_8bit:
 import os
 import re
 import sys
+from itertools import chain
 from ij import IJ
 from ij import CompositeImage
 from ij import ImagePlus
@@ -85,6 +87,8 @@ from java.awt.geom import AffineTransform
 
 sys.path.insert(0, PKG_PATH)
 from rothetal_pkg.fiji import t2
+from rothetal_pkg.fiji.bioformats import get_czi_luts
+from rothetal_pkg.fiji.bioformats import is_rgb_file
 from rothetal_pkg.fiji.bioformats import open_czi
 from rothetal_pkg.fiji.calibration import scale_calibration
 from rothetal_pkg.fiji.multithread import multi_task
@@ -148,11 +152,12 @@ def create_raw_hyperstack3(ext, do_split, first_index, last_index):
         series_map = {}
         input_res_level = None
 
-    # Go through all patches in selected range and map to raw files.
-    patches = [patch for layer in layers for patch in layer.getDisplayables(Patch)]
-    patches_map = {}
-    for patch in patches:
-        key,_ = os.path.splitext(os.path.basename(patch.getImageFilePath()))
+    # Go through all patches in selected range and get key of corresponding raw files.
+    patch_keys = {}
+    for patch in chain.from_iterable(layer.getDisplayables(Patch) for layer in layers):
+        # Filename without extension (plain string ops, both path separators).
+        key = patch.getImageFilePath().replace('\\', '/').rpartition('/')[2]
+        key = key.rpartition('.')[0] or key
         if czi_suffix:
             rmatch = regex(key)
             key = rmatch.group(1)
@@ -166,31 +171,38 @@ def create_raw_hyperstack3(ext, do_split, first_index, last_index):
                 input_res_level = int(rmatch.group(res_group))
             elif input_res_level != int(rmatch.group(res_group)):
                 logmsg('WARNING! %s has a different res level (x%d) than other project files (x%d) ...' % (int(rmatch.group(3)), input_res_level))
-        while patch not in patches_map:
-            try: patches_map[patch] = raw_files[key + FNAME_FIX]
-            except KeyError:
-                dlg = GenericDialog('Missing file...')
-                dlg.addMessage('Raw file for [ %s ] not found in search path, add another location?' % patch.getTitle())
-                dlg.enableYesNoCancel()
-                dlg.showDialog()
-                if dlg.wasOKed():
-                    DirectoryChooser.setDefaultDirectory(project_path)
-                    extra_path = DirectoryChooser('Choose folder with raw image files.').getDirectory()
-                    if extra_path:
-                        raw_files = find_files_by_ext(extra_path, ext, splitext=True, d=raw_files)
-                elif dlg.wasCanceled():
-                    return
-                else:
-                    patches_map[patch] = None
+        patch_keys[patch] = key + FNAME_FIX
+    
+    # Map patches to raw files.  Any missing files are reported together, with the option to add another location.
+    patches_map = {patch: raw_files[key] for patch, key in patch_keys.iteritems() if key in raw_files}
+    missing = [patch for patch in patch_keys if patch not in patches_map]
+    while missing:
+        dlg = GenericDialog('Missing files...')
+        dlg.addMessage('Raw files for %d patch(es) not found in search path (e.g., [ %s ]), add another location?' % (len(missing), missing[0].getTitle()))
+        dlg.enableYesNoCancel()
+        dlg.showDialog()
+        if dlg.wasOKed():
+            DirectoryChooser.setDefaultDirectory(project_path)
+            extra_path = DirectoryChooser('Choose folder with raw image files.').getDirectory()
+            if extra_path:
+                raw_files = find_files_by_ext(extra_path, ext, splitext=True, d=raw_files)
+                patches_map.update((patch, raw_files[patch_keys[patch]]) for patch in missing if patch_keys[patch] in raw_files)
+                missing = [patch for patch in missing if patch not in patches_map]
+        elif dlg.wasCanceled():
+            return
+        else:
+            for patch in missing:
+                patches_map[patch] = None
+            break
     
     # Check file(s) type, if composite, and number of color channels (based on first file in list).
     # Note: MAJOR assumption that all files are the same in this regard (i.e., no mixing of file types/channel numbers).
     is_czi = True if ext == 'czi' else False
     is_rgb = False
     test_raw = next(item for item in patches_map.values() if item is not None)
-    if is_czi:  # Special opener for CZIs.
+    if is_czi:  # Special opener for CZIs -- metadata only, no pixels need to be read.
         is_composite = True
-        tmp, luts = open_czi(test_raw, crop=Rectangle(0, 0, 1, 1))
+        luts, max_range = get_czi_luts(test_raw)
         n_colors = len(luts)
     else:  # Assumed normal file types (TIF, PNG, JPG, etc.)
         tmp = IJ.openImage(test_raw)
@@ -201,19 +213,14 @@ def create_raw_hyperstack3(ext, do_split, first_index, last_index):
         else:
             is_composite = False
             n_colors = 1
-    orig_cal = tmp.getCalibration()  # This should return calibration of the original resolution image, not downsampled.
-    max_range = tmp.getDisplayRangeMax()  # For resetting display range below--should catch 12bit images?
-    tmp.close()
-    tmp.flush()
+        max_range = tmp.getDisplayRangeMax()  # For resetting display range below--should catch 12bit images?
+        tmp.close()
+        tmp.flush()
     
     # If we are dealing with non-composite files, actually need to check them all and see if ANY are RGB.
+    # Only file headers are read, and each raw file is checked once.
     if not is_composite:
-        for raw_path in patches_map.values():
-            tmp = IJ.openImage(raw_path)
-            is_rgb = tmp.getType() == ImagePlus.COLOR_RGB
-            tmp.close()
-            tmp.flush()
-            if is_rgb: break
+        is_rgb = any(is_rgb_file(raw_path) for raw_path in set(patches_map.values()) if raw_path is not None)
     
     # Grab ROI we want to export.
     target_roi_orig = display.getRoi()
@@ -239,148 +246,204 @@ def create_raw_hyperstack3(ext, do_split, first_index, last_index):
         if not force_rgb_8bit:
             is_rgb = True
     final_stack = ImageStack(w, h, len(layers)*n_colors)
+    # Processor type for slices of empty layers (decided once, not per layer).
+    if is_rgb:
+        blank_processor = ColorProcessor
+    elif not force_rgb_8bit and max_range > 65535:
+    # TODO: Not really the best way to detect a Float...
+        blank_processor = FloatProcessor
+    elif not force_rgb_8bit and max_range > 255:
+        blank_processor = ShortProcessor
+    else:
+        blank_processor = ByteProcessor
+    
+    # Channel LUTs (with display range) for RGB conversion, set up once for all patches.
+    if force_rgb and is_composite:
+        rgb_luts = []
+        for lut in luts:
+            lut = lut.clone()
+            lut.min = 0
+            lut.max = max_range
+            rgb_luts.append(lut)
 
-    def extract_layer(s, layer):
+    def extract_patch(patch):
         """ Sub-method to allow for multithreading.
+            Extract and transform raw image for PATCH.  Returns cropped stack and
+            its offset in the final image, or None if PATCH is outside the target ROI.
         """
-        # Iterate through layers.
-        ip = [None] * n_colors
-        # Iterate over patches and transform.
-        for patch in layer.getDisplayables(Patch):  # Should be in sorted order from "bottom" to "top".
-            if not patch.isVisible(): continue  # Skip hidden images.
-            if patches_map[patch] is None: continue  # Skip this image.
-            patch_image = patch.createTransformedImage()
-            # Affine transform applied to corresponding patch.
-            at = patch.getAffineTransformCopy()
-            # Map ROI and its bounds from TrakEM2 workspace to source image.
-            roi_on_source = scale_roi(transform_roi(target_roi, at), sf).and(scale_roi(Roi(patch_image.box), sf))
-            roib_on_source = scale_roi(transform_roi(ShapeRoi(target_bounds), at), sf).and(scale_roi(Roi(patch_image.box), sf))
-            bounds_on_source = get_real_float_bounds(roib_on_source)
-            # If empty boundary, we have nothing to extract from this page.
-            if not bounds_on_source:
-                continue
-            # Get x/y offset for placement of extracted content.
-            bounds_on_display = get_real_float_bounds(transform_roi(scale_roi(roib_on_source, 1.0/sf), at, inverse=False))
-            offset_x = bounds_on_display.x - target_bounds.x
-            offset_y = bounds_on_display.y - target_bounds.y
-            # Make sure crop box doesn't extend beyond bounds of source image.
-            bounds_on_source_int = bounds_on_source.getBounds()
-            bx = bounds_on_source_int.x
-            by = bounds_on_source_int.y
-            bw = min(bounds_on_source_int.width, int(patch_image.box.width * sf) - bx)
-            bh = min(bounds_on_source_int.height, int(patch_image.box.height * sf) - by)
-            # Shift ROI to origin.
-            roi_at_origin = transform_roi(roi_on_source, AffineTransform.getTranslateInstance(bx, by))
-            roib_at_origin = transform_roi(roib_on_source, AffineTransform.getTranslateInstance(bx, by))
-            # Create copy of AffineTransform that is centered on ROI itself.
-            at2 = AffineTransform.getTranslateInstance(bw/2.0, bh/2.0)
-            at2.concatenate(AffineTransform(at.getScaleX(), at.getShearY(), at.getShearX(), at.getScaleY(), 0, 0).createInverse())
-            at2.translate(-bw/2.0, -bh/2.0)
-            # Determine offset caused by expansion of canvas due to image rotation.
-            bounds_after_transform = get_real_float_bounds(transform_roi(Roi(0, 0, bw, bh), at2))
-            # Determine position of ROI and its bounds on extracted image after transform.
-            roi_on_extract = transform_roi(roi_at_origin, at2)
-            roib_on_extract = transform_roi(roib_at_origin, at2)
-            roi_on_extract = transform_roi(roi_on_extract, AffineTransform.getTranslateInstance(bounds_after_transform.x, bounds_after_transform.y))
-            roib_on_extract = transform_roi(roib_on_extract, AffineTransform.getTranslateInstance(bounds_after_transform.x, bounds_after_transform.y))
-            # Create transform in format suitable for image.
-            t = Transform(at.getScaleX(), at.getShearX(), 0, 0,
-                          at.getShearY(), at.getScaleY(), 0, 0,
-                                       0,              0, 1, 0)
+        # Cheap check on workspace bounding box before any pixels are touched.
+        if not target_bounds.intersects(patch.getBoundingBox()):
+            return None
+        patch_image = patch.createTransformedImage()
+        # Affine transform applied to corresponding patch.
+        at = patch.getAffineTransformCopy()
+        # Single transform from TrakEM2 workspace to (scaled) source image: scale(sf) * inverse(at).
+        at_source = AffineTransform.getScaleInstance(sf, sf)
+        at_source.concatenate(at.createInverse())
+        box_on_source = scale_roi(Roi(patch_image.box), sf)
+        # Map ROI and its bounds from TrakEM2 workspace to source image.
+        roi_on_source = transform_roi(target_roi, at_source, inverse=False).and(box_on_source)
+        roib_on_source = transform_roi(ShapeRoi(target_bounds), at_source, inverse=False).and(box_on_source)
+        bounds_on_source = get_real_float_bounds(roib_on_source)
+        # If empty boundary, we have nothing to extract from this page.
+        if not bounds_on_source:
+            return None
+        # Get x/y offset for placement of extracted content.
+        bounds_on_display = get_real_float_bounds(transform_roi(roib_on_source, at_source))
+        offset_x = bounds_on_display.x - target_bounds.x
+        offset_y = bounds_on_display.y - target_bounds.y
+        # Make sure crop box doesn't extend beyond bounds of source image.
+        bounds_on_source_int = bounds_on_source.getBounds()
+        bx = bounds_on_source_int.x
+        by = bounds_on_source_int.y
+        bw = min(bounds_on_source_int.width, int(patch_image.box.width * sf) - bx)
+        bh = min(bounds_on_source_int.height, int(patch_image.box.height * sf) - by)
+        # Create copy of AffineTransform that is centered on ROI itself.
+        at2 = AffineTransform.getTranslateInstance(bw/2.0, bh/2.0)
+        at2.concatenate(AffineTransform(at.getScaleX(), at.getShearY(), at.getShearX(), at.getScaleY(), 0, 0).createInverse())
+        at2.translate(-bw/2.0, -bh/2.0)
+        # Determine offset caused by expansion of canvas due to image rotation.
+        bounds_after_transform = get_real_float_bounds(transform_roi(Roi(0, 0, bw, bh), at2))
+        # Determine position of ROI and its bounds on extracted image after transform.  Shift to origin,
+        # transform, and offset for canvas expansion are combined (applied as inverse by transform_roi).
+        at_extract = AffineTransform.getTranslateInstance(bx, by)
+        at_extract.concatenate(at2)
+        at_extract.translate(bounds_after_transform.x, bounds_after_transform.y)
+        roi_on_extract = transform_roi(roi_on_source, at_extract)
+        roib_on_extract = transform_roi(roib_on_source, at_extract)
+        # Create transform in format suitable for image.
+        t = Transform(at.getScaleX(), at.getShearX(), 0, 0,
+                      at.getShearY(), at.getScaleY(), 0, 0,
+                                   0,              0, 1, 0)
    
-            logmsg('Extracting image for %s ...' % patch.getTitle())
-            if is_czi:  # Special opener for CZIs.
-                if czi_suffix:
-                    imp, _ = open_czi(patches_map[patch], crop=Rectangle(bx, by, bw, bh), series=series_map[patch], pyramid=True, res_level=output_res_level)
-                else:
-                    imp, _ = open_czi(patches_map[patch], crop=Rectangle(bx, by, bw, bh))
+        logmsg('Extracting image for %s ...' % patch.getTitle())
+        if is_czi:  # Special opener for CZIs.
+            if czi_suffix:
+                imp, _ = open_czi(patches_map[patch], crop=Rectangle(bx, by, bw, bh), series=series_map[patch], pyramid=True, res_level=output_res_level)
             else:
-                tmp = IJ.openImage(patches_map[patch])
-                tmp.setRoi(Roi(bx, by, bw, bh))
-                imp = tmp.crop('stack')
-            # Convert to RGB/Gray8 if requested before further manipulations.
-            if force_rgb:
-                if is_composite:
-                    imp = CompositeImage(imp, CompositeImage.COLOR)
-                    for c in reversed(range(len(luts))):
-                        imp.setChannelLut(luts[c], c+1)
-                        imp.setC(c+1)
-                        imp.setDisplayRange(0, max_range)
-                    imp.setMode(CompositeImage.COMPOSITE)
-                    StackConverter(imp).convertToRGB()
-                    if force_rgb_8bit:
-                        imp.setProcessor(imp.getProcessor().convertToByteProcessor(False))
-            mask = patch_image.mask
-            if incl_alpha_mask and mask:
-                mask.setThreshold(0, 0, False)
-                mask_roi = ThresholdToSelection().convert(mask)
-                if mask_roi:
-                    logmsg('Applying alpha mask to %s ...' % patch.getTitle())
-                    mask_roi = scale_roi(mask_roi, sf)
-                    mask_roi = transform_roi(mask_roi, AffineTransform.getTranslateInstance(bx, by)).and(ShapeRoi(Rectangle(imp.getWidth(), imp.getHeight())))
-                    for ch in range(imp.getNChannels()):
-                        imp.setC(ch+1)
-                        tip = imp.getProcessor()
-                        tip.setValue(0)
-                        tip.fill(mask_roi)
-            # Apply transform using imagescience module, export ImagePlus, and get ImageStack.
-            logmsg('Applying transform to %s ... ' % patch.getTitle())
-            tmp = Affine().run(Image.wrap(imp), t, Affine.CUBIC, True, False, False).imageplus().getStack()
-            # Adjust roi_on_extract to clip to bounds of image (subpixel rounding errors can cause crop to fail).
-            roi_on_extract = ShapeRoi(roi_on_extract).and(ShapeRoi(Roi(0, 0, tmp.getWidth(), tmp.getHeight())))
-            roib_on_extract = ShapeRoi(roib_on_extract).and(ShapeRoi(Roi(0, 0, tmp.getWidth(), tmp.getHeight())))
-            # Get bounds on extracted image to facilitate final crop.
-            bounds_on_extract = get_real_float_bounds(roib_on_extract)
-            bounds_on_extract_int = bounds_on_extract.getBounds()
-            bex = bounds_on_extract_int.x
-            bey = bounds_on_extract_int.y
-            bew = min(bounds_on_extract_int.width, tmp.getWidth() - bex)
-            beh = min(bounds_on_extract_int.height, tmp.getHeight() - bey)
-            # Determine position of ROI after final crop.
-            roi_on_final = transform_roi(roi_on_extract, AffineTransform.getTranslateInstance(bex, bey))
-            # Crop stack.
-            logmsg('Cropping %s ... ' % patch.getTitle())
-            stack = tmp.crop(bex, bey, 0, bew, beh, tmp.size())
-            # Sanity check if stack size matches expected number of colors.
-            if stack.getSize() != n_colors:
-                logerror(ValueError, 'Mismatch between image stack size and n_colors...', True)
-            # Iterate through stack slices/colors.
-            logmsg('Moving %s to final stack ... ' % patch.getTitle())
+                imp, _ = open_czi(patches_map[patch], crop=Rectangle(bx, by, bw, bh))
+        else:
+            tmp = IJ.openImage(patches_map[patch])
+            tmp.setRoi(Roi(bx, by, bw, bh))
+            imp = tmp.crop('stack')
+        # Convert to RGB/Gray8 if requested before further manipulations.
+        if force_rgb:
+            if is_composite:
+                imp = CompositeImage(imp, CompositeImage.COLOR)
+                imp.setLuts(rgb_luts)
+                imp.setMode(CompositeImage.COMPOSITE)
+                StackConverter(imp).convertToRGB()
+                if force_rgb_8bit:
+                    imp.setProcessor(imp.getProcessor().convertToByteProcessor(False))
+        mask = patch_image.mask
+        if incl_alpha_mask and mask:
+            mask.setThreshold(0, 0, False)
+            mask_roi = ThresholdToSelection().convert(mask)
+            if mask_roi:
+                logmsg('Applying alpha mask to %s ...' % patch.getTitle())
+                mask_roi = scale_roi(mask_roi, sf)
+                mask_roi = transform_roi(mask_roi, AffineTransform.getTranslateInstance(bx, by)).and(ShapeRoi(Rectangle(imp.getWidth(), imp.getHeight())))
+                # Rasterize mask once, then fill each slice of the stack directly.
+                mask_bounds = mask_roi.getBounds()
+                mask_ip = mask_roi.getMask()
+                mask_stack = imp.getStack()
+                for i in range(mask_stack.getSize()):
+                    tip = mask_stack.getProcessor(i+1)
+                    tip.setValue(0)
+                    tip.setRoi(mask_bounds)
+                    tip.fill(mask_ip)
+                    tip.resetRoi()
+        # Apply transform using imagescience module, export ImagePlus, and get ImageStack.
+        logmsg('Applying transform to %s ... ' % patch.getTitle())
+        tmp = Affine().run(Image.wrap(imp), t, Affine.CUBIC, True, False, False).imageplus().getStack()
+        # Adjust roi_on_extract to clip to bounds of image (subpixel rounding errors can cause crop to fail).
+        roi_on_extract = ShapeRoi(roi_on_extract).and(ShapeRoi(Roi(0, 0, tmp.getWidth(), tmp.getHeight())))
+        roib_on_extract = ShapeRoi(roib_on_extract).and(ShapeRoi(Roi(0, 0, tmp.getWidth(), tmp.getHeight())))
+        # Get bounds on extracted image to facilitate final crop.
+        bounds_on_extract = get_real_float_bounds(roib_on_extract)
+        bounds_on_extract_int = bounds_on_extract.getBounds()
+        bex = bounds_on_extract_int.x
+        bey = bounds_on_extract_int.y
+        bew = min(bounds_on_extract_int.width, tmp.getWidth() - bex)
+        beh = min(bounds_on_extract_int.height, tmp.getHeight() - bey)
+        # Determine position of ROI after final crop.
+        roi_on_final = transform_roi(roi_on_extract, AffineTransform.getTranslateInstance(bex, bey))
+        # Crop stack.
+        logmsg('Cropping %s ... ' % patch.getTitle())
+        stack = tmp.crop(bex, bey, 0, bew, beh, tmp.size())
+        # Sanity check if stack size matches expected number of colors.
+        if stack.getSize() != n_colors:
+            logerror(ValueError, 'Mismatch between image stack size and n_colors...', True)
+        # Clear outside of extract ROI.
+        if clear_outside:
             for c in range(n_colors):
-                # Get processor.
                 tmp = stack.getProcessor(c+1)
-                if ip[c] is None:
+                tmp.setValue(0)
+                tmp.fillOutside(roi_on_final)
+        return stack, int(round(max(offset_x * sf, 0))), int(round(max(offset_y * sf, 0)))
+
+    # Background-filled slice per processor type, filled once and then duplicated (a single array copy) per layer.
+    bg_templates = {}
+
+    def new_background(ref):
+        """ Blank background slice matching processor type of <ref> (RGB if forced).
+        """
+        key = ColorProcessor if is_rgb else ref.getClass()
+        template = bg_templates.get(key)
+        if template is None:
+            if is_rgb:  # Force to RGB-type for non-composite images.
+                template = ColorProcessor(w, h)
+                template.setValue((background_val<<16) + (background_val<<8) + (background_val))
+            else:  # Same type.
+                template = ref.createProcessor(w, h)
+                template.setValue(background_val)
+            template.fill()
+            template = bg_templates.setdefault(key, template)  # Another thread may have gotten here first.
+        return template.duplicate()
+
+    def extract_layer(s, layer):
+        """ Sub-method to allow for multithreading.
+        """
+        # Visible patches with a raw source, in sorted order from "bottom" to "top".
+        patches = [patch for patch in layer.getDisplayables(Patch)
+                   if patch.isVisible() and patches_map[patch] is not None]
+        # Extract patches, in parallel if requested (all extracts of a layer are then held in memory).
+        if n_patch_threads > 1 and len(patches) > 1:
+            extracts = multi_task(extract_patch, [(patch,) for patch in patches], n_threads=n_patch_threads, verbose=False, progress=False)
+        else:
+            extracts = [extract_patch(patch) for patch in patches]
+        # Composite extracted patches in order.
+        ip = [None] * n_colors
+        channels = range(n_colors)
+        copy_mode = Blitter.COPY_ZERO_TRANSPARENT
+        for i in xrange(len(extracts)):
+            extract = extracts[i]
+            if extract is None:
+                continue
+            extracts[i] = None  # Drop list reference so each extracted stack can be collected once composited.
+            stack, x, y = extract
+            get_processor = stack.getProcessor
+            for c in channels:
+                # Get processor.
+                tmp = get_processor(c+1)
+                dst = ip[c]
+                if dst is None:
                     # Create blank processor slice for final stack if not already done.
-                    if is_rgb:  # Force to RGB-type for non-composite images.
-                        ip[c] = ColorProcessor(w, h)
-                        bval = (background_val<<16) + (background_val<<8) + (background_val)
-                    else:  # Same type.
-                        ip[c] = tmp.createProcessor(w, h)
-                        bval = background_val
-                    ip[c].setValue(bval)
-                    ip[c].fill()
-                # Clear outside of extract ROI.
-                if clear_outside:
-                    tmp.setValue(0)
-                    tmp.fillOutside(roi_on_final)
+                    dst = ip[c] = new_background(tmp)
                 # Insert transformed/cropped image into processor.
                 # TODO: Not totally certain about int/round combo...
-                ip[c].copyBits(tmp, int(round(max(offset_x * sf, 0))), int(round(max(offset_y * sf, 0))), Blitter.COPY_ZERO_TRANSPARENT)
+                dst.copyBits(tmp, x, y, copy_mode)
+        extract = stack = get_processor = tmp = None  # Release last extracted stack before building blanks/slices.
+        # Reset display range once all patches are in place (was done after every patch).
+        for c in channels:
+            if ip[c] is not None:
                 ip[c].resetMinAndMax()  # Not sure if needed.
         # If layer was empty, need blank ips.
-        for c in range(n_colors):
+        for c in channels:
             if ip[c] is None:
-                if is_rgb:
-                    ip[c] = ColorProcessor(w, h)
-                elif not force_rgb_8bit and max_range > 65535:
-                # TODO: Not really the best way to detect a Float...
-                    ip[c] = FloatProcessor(w, h)
-                elif not force_rgb_8bit and max_range > 255:
-                    ip[c] = ShortProcessor(w, h)
-                else:
-                    ip[c] = ByteProcessor(w, h)
+                ip[c] = blank_processor(w, h)
         # Add processors as slices to final stack.
-        for c in range(n_colors):
+        for c in channels:
             final_stack.setProcessor(ip[c], (s*n_colors)+1+c)  # 1-indexing for ImageStack.
 
     # Multi-task layer extraction.
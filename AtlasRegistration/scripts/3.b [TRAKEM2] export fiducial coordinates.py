@@ -28,6 +28,8 @@ from rothetal_pkg.fiji.t2.objs import find_in_project
 CSV_PATH = os.path.join(ROOT_DIR, r'CSVs')
 
 cal = t2.get_calibration()
+# Python-side copies of cal.getRawX()/getX(), i.e. x / pixelWidth + xOrigin and (x - xOrigin) * pixelWidth.
+pw, x0 = cal.pixelWidth, cal.xOrigin
 rect = find_in_project('rect', obj_type='area_list', select=False)
 fids = find_in_project('fiducials', obj_type='ball', select=False)
 
@@ -37,30 +39,25 @@ fid_names = ['cca', 'act', 'dg', 'ccp', 'sco', 'lgn_l', 'lgn_r', 'str_l', 'str_r
 
 ### FIDUCIAL POINTS
 f_points = [[ round(b[2] / cal.pixelDepth) - 1,  # !! My TrakEM2 projects start with index 1, not zero...
-              round(cal.getRawX(b[1])), 
-              round(cal.getRawX(b[0])), ]
+              round(b[1] / pw + x0), 
+              round(b[0] / pw + x0), ]
             for b in fids.getWorldBalls()]
-f_out = 'id,ap,dv,lm\n'
-for name, (ap, dv, lm) in zip(fid_names, f_points):
-    f_out += '%s,%d,%d,%d\n' % (name, ap, dv, lm)
+f_rows = ['id,ap,dv,lm']
+f_rows.extend('%s,%d,%d,%d' % (name, ap, dv, lm) for name, (ap, dv, lm) in zip(fid_names, f_points))
 f_path = os.path.join(CSV_PATH, csv_base + '_fiducials.csv')
-f_file = open(f_path, 'w')
-f_file.write(f_out)
-f_file.close()
+with open(f_path, 'w') as f_file:
+    f_file.write('\n'.join(f_rows) + '\n')
 print('Saved fiducials to %s!' % f_path)
 
 ### RECTANGLE POINTS
-r_points = [vert
-             for layer in rect.getLayerRange()
-             for z, bounds in [[round(cal.getX(layer.getZ()) / cal.pixelDepth) - 1, rect.getBounds(None, layer)]]
-                 if (bounds.width + bounds.height) > 0
-             for vert in [ (z, bounds.y, bounds.y + bounds.height, bounds.x, bounds.x + bounds.width) ] ]
-
-r_out = 'ap,d,v,m,l\n'
-for (ap, d, v, m, l) in r_points:
-    r_out += '%d,%d,%d,%d,%d\n' % (ap, d, v, m, l)
+# One bounds lookup per layer, formatted straight into CSV rows (layers without rectangle are skipped).
+r_rows = ['ap,d,v,m,l']
+for layer in rect.getLayerRange():
+    bounds = rect.getBounds(None, layer)
+    if (bounds.width + bounds.height) > 0:
+        z = round((layer.getZ() - x0) * pw / cal.pixelDepth) - 1
+        r_rows.append('%d,%d,%d,%d,%d' % (z, bounds.y, bounds.y + bounds.height, bounds.x, bounds.x + bounds.width))
 r_path = os.path.join(CSV_PATH, csv_base + '_rectangles.csv')
-r_file = open(r_path, 'w')
-r_file.write(r_out)
-r_file.close()
+with open(r_path, 'w') as r_file:
+    r_file.write('\n'.join(r_rows) + '\n')
 print('Saved rectangles to %s!' % r_path)
\ No newline at end of file
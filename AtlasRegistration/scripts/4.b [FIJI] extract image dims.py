@@ -13,20 +13,27 @@ import sys
 
 sys.path.insert(0, PKG_PATH)
 from rothetal_pkg.fiji.bioformats import get_czi_series_info
+from rothetal_pkg.fiji.multithread import multi_task
 
 brain = 8
 start = 100
 stop = 118
+n_threads = 8  # Files read in parallel (metadata only, so mostly waiting on I/O).
 
 mx = 0
 my = 0
 
 out = ''
 
-for i in range(start, stop+1):
+def get_dims(i):
     fname = 'RRJD%d_%d_10x.ome.tiff' % (brain, i)
     si = get_czi_series_info(os.path.join(ROOT_DIR, r"Brain%d\10x" % brain, fname))
-    x, y = si.dim[0][0]
+    return si.dim[0][0]
+
+idxs = range(start, stop+1)
+dims = multi_task(get_dims, [(i,) for i in idxs], n_threads=n_threads, verbose=False)
+
+for i, (x, y) in zip(idxs, dims):
     mx = max(mx, x)
     my = max(my, y)
     out += '%d\t%d\t%d\n' % (i, x, y)
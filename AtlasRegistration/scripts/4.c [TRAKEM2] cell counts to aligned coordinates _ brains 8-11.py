@@ -68,9 +68,11 @@ DOWNSAMPLING = 4.
 
 print t2.get_project()  # Double check correct project is open.
 cal = t2.get_calibration()
+# Python-side copy of cal.getX(), i.e. (x - xOrigin) * pixelWidth, to avoid a Java call per coordinate.
+pw, x0 = cal.pixelWidth, cal.xOrigin
 patches = t2.get_all_patches()
-atdict = {int(round(cal.getX(patch.getLayer().getZ()) / SECTION_THICKNESS)):patch.getAffineTransform() for patch in patches}
-pdict = {int(round(cal.getX(patch.getLayer().getZ()) / SECTION_THICKNESS)):patch for patch in patches}
+atdict = {int(round((patch.getLayer().getZ() - x0) * pw / SECTION_THICKNESS)):patch.getAffineTransform() for patch in patches}
+pdict = {int(round((patch.getLayer().getZ() - x0) * pw / SECTION_THICKNESS)):patch for patch in patches}
 
 zs = [z + zoff for z in xlsvals[0::3]]  # leave zs as cell count numbers until later
 xs = [(x + xoff - offsets[z + offsets_shift][0])/DOWNSAMPLING for x, z in zip(xlsvals[1::3], zs)]  # factor in downsampling of t2 project
@@ -84,15 +86,13 @@ for z in zdict:
     zdict[z] = array('d', zdict[z])
     atdict[z].transform(zdict[z], 0, zdict[z], 0, len(zdict[z])//2)
 
-c_out = 'AP,DV,LM\n'
+c_rows = ['AP,DV,LM']
 
 for z in sorted(zdict.keys()):
     for x, y in zip(zdict[z][0::2], zdict[z][1::2]):
-        c_out += '\n'.join(['%d,%0.6f,%0.6f' % ((z-1)*SECTION_THICKNESS, cal.getX(y), cal.getX(x))])  # NOTE FLIPPED X/Y, AND 1- to 0- Z-index!!
-        c_out += '\n'
+        c_rows.append('%d,%0.6f,%0.6f' % ((z-1)*SECTION_THICKNESS, (y - x0) * pw, (x - x0) * pw))  # NOTE FLIPPED X/Y, AND 1- to 0- Z-index!!
 
 c_path = os.path.join(CSV_PATH, csv_base + '_cellcoords.csv')
-c_file = open(c_path, 'w')
-c_file.write(c_out)
-c_file.close()
+with open(c_path, 'w') as c_file:
+    c_file.write('\n'.join(c_rows) + '\n')
 print('cell coords saved to %s' % c_path)
\ No newline at end of file
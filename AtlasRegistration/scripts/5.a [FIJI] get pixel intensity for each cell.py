@@ -10,6 +10,9 @@
     within Cell Counter window click 'Measure...' to open a ResultsTable.
 """
 
+# Custom script path (must contain rothetal_pkg folder).
+PKG_PATH = r'<<FILEPATH_TO_SCRIPTS>>'
+
 # CSV path.
 CSV_PATH = r'<<FILEPATH_TO_CSV_FOLDER>>'
 
@@ -17,62 +20,96 @@ CSV_PATH = r'<<FILEPATH_TO_CSV_FOLDER>>'
 BRAIN_NUM = 6  # <-- for loading correct _cellcoords.csv to insert intensity values.
 
 import os
+import sys
 from copy import copy
 from ij import IJ
 from ij.gui import OvalRoi
 from ij.measure import ResultsTable
 
+sys.path.insert(0, PKG_PATH)
+from rothetal_pkg.fiji.multithread import multi_task
+
 PX_OFF = 0.5  # Offset to make sure we're measuring center of pixel.
 # In microns.
 DIAMETERS = [25]  # ROI diameters to test.
 TH_PCT = 0.2  # % of most-intense pixels within ROI to measure.
+N_THREADS = None  # Slices measured in parallel (None = all available processors).
 
 imp = IJ.getImage()
 stack = imp.getStack()
 cal = imp.getCalibration()
+D_PX = {d: cal.getRawX(d) for d in DIAMETERS}  # ROI diameters in pixels.
+# Output columns for each diameter, in order of values returned by get_vals().
+COLUMNS = {d: ('D%d_mean' % d, 'D%d_median' % d, 'D%d_max' % d, 'D%d-P%0.2f_mean' % (d, TH_PCT)) for d in DIAMETERS}
 
-def get_vals(i, s, x, y, d, p=TH_PCT):
-    col_mean = 'D%d_mean' % d
-    col_med = 'D%d_median' % d
-    col_max = 'D%d_max' % d
-    col_perc = 'D%d-P%0.2f_mean' % (d, p)
-    ip = stack.getProcessor(int(s))
-    d_px = cal.getRawX(d)
+def get_vals(ip, x, y, d, rois):
+    """ Measure circle of diameter D around cell at X, Y on IP.  Returns values for COLUMNS[D].
+        ROIS caches OvalRois by diameter and sub-pixel offset: an Roi keeps its rasterized mask
+        while its size is unchanged, so moving a cached Roi avoids re-rasterizing the circle.
+    """
+    d_px = D_PX[d]
     r_px = d_px / 2.0
-    roi = OvalRoi(x - r_px + PX_OFF, y - r_px + PX_OFF, d_px, d_px)
+    rx = x - r_px + PX_OFF
+    ry = y - r_px + PX_OFF
+    key = (d, rx % 1, ry % 1)  # Mask only depends on sub-pixel offset, not integer position.
+    roi = rois.get(key)
+    if roi is None:
+        roi = rois[key] = OvalRoi(rx, ry, d_px, d_px)
+    else:
+        roi.setLocation(rx, ry)
     ip.setRoi(roi)
     stats = ip.getStatistics()
-    rt.setValue(col_mean, i, stats.mean)
-    rt.setValue(col_med, i, stats.median)
-    rt.setValue(col_max, i, stats.max)
     
-    hist = ip.getHistogram()
-    thresh = sum(hist) * p
+    # Reuse 16-bit histogram already computed for the stats when available, otherwise compute it.
+    if stats.histogram16 is not None:
+        hist = stats.histogram16
+    else:
+        hist = ip.getHistogram()
+    thresh = stats.pixelCount * TH_PCT
     cum_cnt = 0
-    cum_val = 0
-    # March backwards through histogram, adding up values
-    # until count threshold is reached.
-    for idx, val in enumerate(hist[::-1]):
+    cum_val = 0.0
+    # March backwards through histogram (bin == pixel value), adding up values
+    # until count threshold is reached.  Bins above ROI max are empty, so start there.
+    for v in xrange(int(stats.max), -1, -1):
+        val = hist[v]
         if val > 0:
             cum_cnt += val
-            cum_val += (val * (ip.maxValue() - idx))
+            cum_val += (val * v)
             if cum_cnt > thresh:
                 break
-    rt.setValue(col_perc, i, cum_val / cum_cnt)
-    return
+    return stats.mean, stats.median, stats.max, cum_val / cum_cnt
+
+
+def measure_slice(s, cells):
+    """ Measure all CELLS (row, x, y) on slice S.  Returns (row, diameter, values) for each measurement.
+        Run as a thread task, so results are written to the ResultsTable afterwards (not thread-safe).
+    """
+    ip = stack.getProcessor(int(s))
+    rois = {}  # Per task, Rois are not thread-safe.
+    return [(i, d, get_vals(ip, x, y, d, rois)) for i, x, y in cells for d in DIAMETERS]
 
 rt = ResultsTable.getActiveTable().clone()
 
-# This could be multi-threaded by slice, but not worth effort.
+# Group cells by slice, then measure slices in parallel.
+cells_by_slice = {}
 for i, (s, x, y) in enumerate(zip( rt.getColumn('Slice'), 
                                    rt.getColumn('X'),
                                    rt.getColumn('Y'), )):
-    IJ.showProgress(i, rt.getCounter())
-    for d in DIAMETERS:
-        get_vals(i, s, x, y, d)
+    cells_by_slice.setdefault(s, []).append((i, x, y))
+results = multi_task(measure_slice, cells_by_slice.items(), n_threads=N_THREADS, verbose=False)
+# Gather values per column, then write each column to the table at once.
+n_cells = rt.getCounter()
+col_vals = {col: [0.0] * n_cells for d in DIAMETERS for col in COLUMNS[d]}
+for result in results:
+    for i, d, vals in result:
+        for col, val in zip(COLUMNS[d], vals):
+            col_vals[col][i] = val
+for d in DIAMETERS:
+    for col in COLUMNS[d]:
+        rt.setValues(col, col_vals[col])
 
-# Note hard-coded to final value used.
-intensities = rt.getColumn('D%d-P%0.2f_mean' % (25, .2))
+# Note hard-coded to final value used.  Taken from gathered values rather than read back from table.
+intensities = col_vals['D%d-P%0.2f_mean' % (25, .2)]
 rt_out = ResultsTable.open(os.path.join(CSV_PATH, 'brain%d_cellcoords.csv' % BRAIN_NUM))
 rt_out.setPrecision(6)
 rt_out.setValues('intensity', intensities)
@@ -6,6 +6,7 @@
 CSV_PATH = r'<<FILEPATH_TO_CSV_FOLDER>>'
 
 import os
+import numpy as np
 import pandas as pd
 
 brains = [6]  # <- Brain ID(s) (as a list).
@@ -14,7 +15,9 @@ col = 'intensity'
 for b in brains:
     df = pd.read_csv(os.path.join(CSV_PATH, 'brain%d_cellcoords.csv' % b))
     colnorm = col + '_norm'
-    df.loc[:, colnorm] = df.loc[:, col].astype(float)
-    df.loc[:, colnorm] -= df.loc[:, colnorm].min()
-    df.loc[:, colnorm] /= df.loc[:, colnorm].max()
+    # Normalize in place on a float copy of the column, then assign once (NaNs skipped, as in pandas).
+    v = df[col].to_numpy(dtype=np.float64, copy=True)
+    v -= np.nanmin(v)
+    v /= np.nanmax(v)
+    df[colnorm] = v
     df.to_csv(os.path.join(CSV_PATH, 'brain%d_cellcoords.csv' % b), index=False)
\ No newline at end of file
@@ -18,7 +18,11 @@ from scipy.ndimage import center_of_mass
 # Custom modules.
 sys.path.insert(0, PKG_PATH)
 from rothetal_pkg.napari.aba import get_aba
+from rothetal_pkg.napari.aba import apply_hemi
 from rothetal_pkg.napari.aba import get_aba_mask
+from rothetal_pkg.napari.utils import first_last_nonzero
+from rothetal_pkg.napari.utils import first_nonzero
+from rothetal_pkg.napari.utils import last_nonzero
 
 # CSV path.
 CSV_PATH = os.path.join(ROOT_DIR, 'CSVs')
@@ -82,96 +86,99 @@ hemi_flag = 'left'
     or anterior-most section of 'TH' if somehow a gap be. 
     Also posterior-most section of 'TH'. """
 mid_distance = 250  # In um.
-# Get 'act' mask.
-mask = get_aba_mask('act', aba=aba, hemi=hemi_flag)
+# Get 'act' mask (both hemis, for 'act' fiducial below).
+act_mask = get_aba_mask('act', aba=aba)
+mask = apply_hemi(act_mask.copy(), hemi_flag)
 # Get indices within midline.
 mid_val = mask.shape[2] / 2
 mid_range = np.arange(np.floor(mid_val - (mid_distance / RES)), 
                        np.ceil(mid_val + (mid_distance / RES)), dtype=int)
+mid_slice = slice(mid_range[0], mid_range[-1] + 1)
 # Collapse to A-P axis only.
-mask = np.sum(mask[:,:,mid_range], axis=(2, 1))
+mask = np.any(mask[:,:,mid_slice], axis=(2, 1))
 # Z-index of last section with 'act' + 1.
 idx = np.amax(np.flatnonzero(mask)) + 1
 # Get 'TH' mask.
-mask = get_aba_mask('TH', aba=aba, hemi=hemi_flag)
+th_mask = get_aba_mask('TH', aba=aba, hemi=hemi_flag, as_bool=True)  # To save for repeat uses later on.
 # Collapse to A-P axis only.
-mask = np.sum(mask, axis=(2,1))
+mask = np.any(th_mask, axis=(2,1))
 # Z-index of first section with 'TH' _OR_ first past 'act'.
 idx_a = np.amax([idx, np.amin(np.flatnonzero(mask))])
 # Z-index of last section with 'TH' + another 100 um buffer (+ 1).
 idx_p = np.amax(np.flatnonzero(mask)) + (100 // RES) + 1
 
 
+def ap_full(proj):
+    """ Place PROJ (computed from the idx_a:idx_p sections only) into a full-length A-P array,
+        leaving sections outside of A-P range empty.
+    """
+    full = np.zeros((th_mask.shape[0],) + proj.shape[1:], dtype=proj.dtype)
+    full[idx_a:idx_p] = proj
+    return full
+
+
 """ Dorsal and ventral bounds of ((TH + MB) - EPI) in each section within A-P range. """
-mask = np.logical_xor(np.logical_or(get_aba_mask('TH', aba=aba, hemi=hemi_flag).astype(bool),
-                                    get_aba_mask('MB', aba=aba, hemi=hemi_flag).astype(bool)),
-                      get_aba_mask('EPI', aba=aba, hemi=hemi_flag).astype(bool))
-mask[:idx_a, :, :] = False
-mask[idx_p:, :, :] = False
-mask_tmp = np.sum(mask, axis=2)
-idx_th_d = np.array([np.amin(np.flatnonzero(mask_tmp[i, :])) if np.any(mask_tmp[i, :]) else np.nan for i in range(mask_tmp.shape[0])])
-idx_th_v = np.array([np.amax(np.flatnonzero(mask_tmp[i, :])) if np.any(mask_tmp[i, :]) else np.nan for i in range(mask_tmp.shape[0])])
+epi_mask = get_aba_mask('EPI', aba=aba, hemi=hemi_flag, as_bool=True)  # To save for repeat uses later on.
+mask = np.not_equal(get_aba_mask('MB', aba=aba, hemi=hemi_flag)[idx_a:idx_p], 0)
+np.logical_or(mask, th_mask[idx_a:idx_p], out=mask)
+np.logical_xor(mask, epi_mask[idx_a:idx_p], out=mask)
+mask_dv = ap_full(np.any(mask, axis=2))
+mask_lm = ap_full(np.any(mask, axis=1))
+mask_tmp = mask_dv
+idx_th_d, idx_th_v = first_last_nonzero(mask_tmp)
 
 
 """ Lateral and medial bounds of (TH - EPI) in each section within A-P range. """
-mask_tmp = np.sum(mask, axis=1)
+mask_tmp = mask_lm
 if hemi_flag.lower().startswith('l'):
-    idx_l = np.array([np.amax(np.flatnonzero(mask_tmp[i, :])) if np.any(mask_tmp[i, :]) else np.nan for i in range(mask_tmp.shape[0])])
+    idx_l = last_nonzero(mask_tmp)
 elif hemi_flag.lower().startswith('r'):
-    idx_l = np.array([np.amin(np.flatnonzero(mask_tmp[i, :])) if np.any(mask_tmp[i, :]) else np.nan for i in range(mask_tmp.shape[0])])
+    idx_l = first_nonzero(mask_tmp)
 idx_m = mid_val  # From above.
 
 
 """ Ventral bound of mid-region of (SCs) in each section within A-P range. """
-mask = get_aba_mask('SCs', aba=aba, hemi=hemi_flag).astype(bool)
-mask[:idx_a, :, :] = False
-mask[idx_p:, :, :] = False
-mask = np.sum(mask[:, :, mid_range], axis=2)
-idx_sc_v = np.array([np.amax(np.flatnonzero(mask[i, :])) if np.any(mask[i, :]) else np.nan for i in range(mask.shape[0])])
+mask = ap_full(np.any(get_aba_mask('SCs', aba=aba, hemi=hemi_flag)[idx_a:idx_p, :, mid_slice], axis=2))
+idx_sc_v = last_nonzero(mask)
 
 
 """ Dorsal bound of ((TH + MB) - EPI) except if (SCs) present, then its ventral bound. """
-idx_d = np.nanmax(np.vstack((idx_th_d, idx_sc_v)), axis=0)
+idx_d = np.fmax(idx_th_d, idx_sc_v)  # Ignores NaN.
 
 
 """ Dorsal and ventral bounds of (int + cpd) in each section within A-P range. """
-mask = np.logical_or(get_aba_mask('int', aba=aba, hemi=hemi_flag).astype(bool),
-                     get_aba_mask('cpd', aba=aba, hemi=hemi_flag).astype(bool))
-mask[:idx_a, :, :] = False
-mask[idx_p:, :, :] = False
-mask = np.sum(mask, axis=2)
-idx_ic_d = np.array([np.amin(np.flatnonzero(mask[i, :])) if np.any(mask[i, :]) else np.nan for i in range(mask.shape[0])])
-idx_ic_v = np.array([np.amax(np.flatnonzero(mask[i, :])) if np.any(mask[i, :]) else np.nan for i in range(mask.shape[0])])
+# Project each structure within A-P range and combine.
+mask = np.any(get_aba_mask('int', aba=aba, hemi=hemi_flag)[idx_a:idx_p], axis=2)
+np.logical_or(mask, np.any(get_aba_mask('cpd', aba=aba, hemi=hemi_flag)[idx_a:idx_p], axis=2), out=mask)
+mask = ap_full(mask)
+idx_ic_d, idx_ic_v = first_last_nonzero(mask)
 
 
 """ Dorsal bound of (IIn) in each section within A-P range. """
-mask = get_aba_mask('IIn', aba=aba, hemi=hemi_flag).astype(bool)
-mask[:idx_a, :, :] = False
-mask[idx_p:, :, :] = False
-mask = np.sum(mask, axis=2)
-idx_iin_d = np.array([np.amin(np.flatnonzero(mask[i, :])) if np.any(mask[i, :]) else np.nan for i in range(mask.shape[0])])
+iin_mask = get_aba_mask('IIn', aba=aba, hemi=hemi_flag, as_bool=True)  # To save for repeat uses later on.
+mask = ap_full(np.any(iin_mask[idx_a:idx_p], axis=2))
+idx_iin_d = first_nonzero(mask)
 
 
 """ Switch-over point where (IIn) is more dorsal than ventral edge of (int + cpd). """
-xover_v = np.argmax((idx_ic_v - idx_iin_d) >= 0)
+xover_v = np.argmax(idx_ic_v >= idx_iin_d)
 
 
 """ Dorsal-most bound of blob of (V3) closest to ventral-most bound of (TH) in each section within A-P range. """
-mask = get_aba_mask('V3', aba=aba, hemi=hemi_flag).astype(bool)
-mask = np.sum(mask, axis=2)
-mask = [np.flatnonzero(mask[i, :]) if np.any(mask[i, :]) else np.zeros(1) for i in range(mask.shape[0])]
+mask = ap_full(np.any(get_aba_mask('V3', aba=aba, hemi=hemi_flag)[idx_a:idx_p], axis=2))
 # Index of dorsal-most bound of each V3 blob.
-mask = [m[np.flatnonzero(np.hstack(([1], np.diff(m) - 1)))] for m in mask]
-# Differences from TH ventral-most bound.
-mask = np.array([m[np.argmin(np.abs(m - th_v))] for m, th_v in zip(mask, idx_th_v)])
+starts = mask.copy()
+starts[:, 1:] &= ~mask[:, :-1]
+# Closest to TH ventral-most bound.
+dv = np.arange(mask.shape[1])
+mask = dv[np.argmin(np.where(starts, np.abs(dv - idx_th_v[:, np.newaxis]), np.inf), axis=1)].astype(float)
 mask[:idx_a] = np.nan
 mask[idx_p:] = np.nan
 # Fix for sections without V3 annotations within A-P range.. use value from next-posterior section.
-for i in range(len(mask))[::-1]:
-    if np.isnan(mask[i]):
-        continue
-    elif mask[i] < idx_d[i]:
-        mask[i] = mask[i+1]
+bad = mask < idx_d
+idx_next = np.where(bad, len(mask), np.arange(len(mask)))
+idx_next = np.minimum.accumulate(idx_next[::-1])[::-1]
+mask[bad] = np.append(mask, np.nan)[idx_next[bad]]
 idx_v3_d = np.array(mask)
 
 
@@ -183,15 +190,16 @@ idx_v3_d = np.array(mask)
 """
 idx_v = np.hstack((idx_v3_d[:xover_v], idx_ic_v[xover_v:])) + 1
 # Fix for very last couple sections where (int + cpd) disappears.  Just duplicate the posterior-most value.
-for i in range(idx_a, idx_p):
-    if np.isnan(idx_v[i]):
-        idx_v[i] = idx_v[i-1]
+seg = idx_v[max(idx_a-1, 0):idx_p]
+idx_prev = np.where(np.isnan(seg), 0, np.arange(len(seg)))
+np.maximum.accumulate(idx_prev, out=idx_prev)
+seg[:] = seg[idx_prev]
 
 
 """ Switch-over point where (IIn) is more dorsal than dorsal edge of (int + cpd).
     Used to compute a fiducial.
 """
-xover_d = np.argmax((idx_ic_d - idx_iin_d) >= 0)
+xover_d = np.argmax(idx_ic_d >= idx_iin_d)
 
 
 ##########################################################################################
@@ -206,31 +214,35 @@ xover_d = np.argmax((idx_ic_d - idx_iin_d) >= 0)
 
 """ Anterior-most appearance of Dentate Gyrus ('DG') within 0.5mm of midline. """
 f_dg = np.zeros(3)
-mask = get_aba_mask('DG', aba=aba).astype(bool)
-f_dg[0] = np.amin(np.flatnonzero(np.sum(mask[:, :, mid_range], axis=(2, 1))))  # <-- mid_range added here 2024.10.18
-f_dg[1] = np.mean(np.flatnonzero(np.sum(mask[f_dg[0].astype(int), :, :][:, mid_range], axis=1)))  ####
+mask = get_aba_mask('DG', aba=aba)
+idx = int(np.amin(np.flatnonzero(np.any(mask[:, :, mid_slice], axis=(2, 1)))))  # <-- mid_range added here 2024.10.18
+f_dg[0] = idx
+f_dg[1] = np.mean(np.flatnonzero(np.any(mask[idx, :, mid_slice], axis=1)))  ####
 f_dg[2] = mid_val
 
 
 """ Posterior-most section of anterior commissure 'act' within 0.5mm of midline. """
 f_act = np.zeros(3)
-mask = get_aba_mask('act', aba=aba)
-f_act[0] = np.amax(np.flatnonzero(np.sum(mask[:, :, mid_range], axis=(2, 1))))
-f_act[1] = np.mean(np.flatnonzero(np.sum(mask[f_act[0].astype(int), :, :][:, mid_range], axis=1)))  # Double-indexing to stop dimensions shifting order.
+mask = act_mask  # From above.
+idx = int(np.amax(np.flatnonzero(np.any(mask[:, :, mid_slice], axis=(2, 1)))))
+f_act[0] = idx
+f_act[1] = np.mean(np.flatnonzero(np.any(mask[idx, :, mid_slice], axis=1)))
 f_act[2] = mid_val
 
 
 """ Anterior-most and posterior-most positions of corpus callosum ('cc') that cross the midline. """
 f_cca = np.zeros(3)
 f_ccp = np.zeros(3)
-mask = get_aba_mask('cc', aba=aba).astype(bool)
+mask = get_aba_mask('cc', aba=aba)
 # 'cc' is wide enough that it spans the entirety of 'mid_range' on the L-M axis,
 # so any sections that do not span the midline will have zeros in them and report False below.
-tmp = np.all(np.sum(mask, axis=1)[:, mid_range], axis=1)
-f_cca[0] = np.amin(np.flatnonzero(tmp))
-f_ccp[0] = np.amax(np.flatnonzero(tmp))
-f_cca[1] = np.mean(np.flatnonzero(np.sum(mask[f_cca[0].astype(int), :, :][:, mid_range], axis=1)))
-f_ccp[1] = np.mean(np.flatnonzero(np.sum(mask[f_ccp[0].astype(int), :, :][:, mid_range], axis=1)))
+tmp = np.all(np.any(mask[:, :, mid_slice], axis=1), axis=1)
+idx_cca = int(np.amin(np.flatnonzero(tmp)))
+idx_ccp = int(np.amax(np.flatnonzero(tmp)))
+f_cca[0] = idx_cca
+f_ccp[0] = idx_ccp
+f_cca[1] = np.mean(np.flatnonzero(np.any(mask[idx_cca, :, mid_slice], axis=1)))
+f_ccp[1] = np.mean(np.flatnonzero(np.any(mask[idx_ccp, :, mid_slice], axis=1)))
 f_cca[2] = mid_val
 f_ccp[2] = mid_val
 
@@ -239,31 +251,31 @@ f_ccp[2] = mid_val
 # Get 'LGv' mask.
 mask = get_aba_mask('LGv', aba=aba, hemi=hemi_flag)
 # Z-index of posterior-most section.
-idx = np.amax(np.flatnonzero(np.sum(mask, axis=(2, 1))))
+idx = np.amax(np.flatnonzero(np.any(mask, axis=(2, 1))))
 # Fiducial is center-of-mass of this section.
-f_lgv = np.hstack((idx, center_of_mass(mask[idx].astype(bool))))
+f_lgv = np.hstack((idx, center_of_mass(mask[idx])))
 
 
 """ Center of posterior-most MG. <<< MIGHT NEED TO CHECK ABOUT THAT SINGLE PIXEL IN LAST SECTION """
 # Get 'MG' mask.
 mask = get_aba_mask('MG', aba=aba, hemi=hemi_flag)
 # Z-index of posterior-most section.
-idx = np.amax(np.flatnonzero(np.sum(mask, axis=(2, 1))))
+idx = np.amax(np.flatnonzero(np.any(mask, axis=(2, 1))))
 # Fiducial is center-of-mass of this section.
-f_mg = np.hstack((idx, center_of_mass(mask[idx].astype(bool))))
+f_mg = np.hstack((idx, center_of_mass(mask[idx])))
 
 
 """ Dorsal bound of (IIn) as it crosses ventral and dorsal bounds of (int + cpd). """
-# Get 'IIn' mask.
-mask = get_aba_mask('IIn', aba=aba, hemi=hemi_flag).astype(bool)
-mask[:idx_a, :, :] = False
-mask[idx_p:, :, :] = False
+# Get 'IIn' mask (from above); switch-over sections must be within A-P range.
+if not (idx_a <= xover_v < idx_p and idx_a <= xover_d < idx_p):
+    raise ValueError('(IIn) switch-over points are outside of A-P range!')
+mask = iin_mask
 # Dorsal-edge of 'IIn' as it crosses ventral (int + cpd), from above.
-tmp_v = np.amin(np.flatnonzero(np.sum(mask[xover_v, :, :], axis=1)))
+tmp_v = np.amin(np.flatnonzero(np.any(mask[xover_v, :, :], axis=1)))
 # Average L-M coordinate to complete fiducial.
 f_iinv = np.array([xover_v, tmp_v, np.mean(np.flatnonzero(mask[xover_v, tmp_v, :]))])
 # Dorsal-edge of 'IIn' as it crosses dorsal (int + cpd), from above.
-tmp_d = np.amin(np.flatnonzero(np.sum(mask[xover_d, :, :], axis=1)))
+tmp_d = np.amin(np.flatnonzero(np.any(mask[xover_d, :, :], axis=1)))
 # Average L-M coordinate to complete fiducial.
 f_iind = np.array([xover_d, tmp_d, np.mean(np.flatnonzero(mask[xover_d, tmp_d, :]))])
 
@@ -271,10 +283,10 @@ f_iind = np.array([xover_d, tmp_d, np.mean(np.flatnonzero(mask[xover_d, tmp_d, :
 """ Midpoint of (SCO) in section just posterior to end of (EPI). """
 f_sco = np.zeros(3)
 # Posterior-edge of 'EPI' + 1.
-mask = get_aba_mask('EPI', aba=aba, hemi=hemi_flag).astype(bool)
-f_sco[0] = np.amax(np.flatnonzero(np.sum(mask, axis=(2, 1)))) + 1
-mask = get_aba_mask('SCO', aba=aba, hemi=hemi_flag).astype(bool)
-f_sco[1] = np.mean(np.flatnonzero(np.sum(mask[f_sco[0].astype(int), :, :][:, mid_range], axis=1)))
+idx = int(np.amax(np.flatnonzero(np.any(epi_mask, axis=(2, 1)))) + 1)
+f_sco[0] = idx
+mask = get_aba_mask('SCO', aba=aba, hemi=hemi_flag)
+f_sco[1] = np.mean(np.flatnonzero(np.any(mask[idx, :, mid_slice], axis=1)))
 f_sco[2] = mid_val
 
 
@@ -284,35 +296,44 @@ f_sco[2] = mid_val
 ##########################################################################################
 
 """ Create and add rectangle shapes to napari matching above bounds. """
-r_verts = np.stack((idx_d, idx_v, idx_l, np.tile(idx_m, idx_l.shape)), axis=1)
-r_corners = r_verts[idx_a:idx_p, [[0, 2], [0, 3], [1, 3], [1, 2]]]
-idx_ap = np.tile(np.arange(idx_a, idx_p).reshape((r_corners.shape[0], 1, 1)), (1, 4, 1))
-r_shapes = np.concatenate((idx_ap, r_corners), axis=2)
+# Only sections within A-P range.
+r_verts = np.stack((idx_d[idx_a:idx_p], idx_v[idx_a:idx_p], idx_l[idx_a:idx_p], np.broadcast_to(idx_m, idx_l[idx_a:idx_p].shape)), axis=1)
+r_corners = r_verts[:, [[0, 2], [0, 3], [1, 3], [1, 2]]]
+# A-P coordinate of each rectangle.
+ap_coords = np.arange(idx_a, idx_p, dtype=float)
+# A-P coordinate for all 4 corners, then the D-V/L-M corners.
+r_shapes = np.empty(r_corners.shape[:2] + (3,))
+r_shapes[:, :, 0] = ap_coords[:, np.newaxis]
+r_shapes[:, :, 1:] = r_corners
 if SHOW_RESULT:
     r_layer = viewer.add_shapes(r_shapes, shape_type='polygon', name='aba_rects')
     r_layer.scale *= RES
 
 
 """ Create and add fiducial shapes to napari. """
+fids = np.array((f_cca, f_act, f_dg, f_ccp, f_sco))
 if SHOW_RESULT:
     tris = viewer.add_shapes(np.array([np.vstack((f_act, f_cca, f_ccp)), np.vstack((f_act, f_cca, f_dg))]), 
                              shape_type='polygon', face_color=[0,0,0,0], edge_color=['cyan', 'red'], edge_width=1, name='aba_fiducials')
     tris.scale *= RES
-    trisp = viewer.add_points(np.vstack((f_cca, f_act, f_dg, f_ccp, f_sco)), size=0.4, face_color='yellow', name='aba_fiducials2')
+    trisp = viewer.add_points(fids, size=0.4, face_color='yellow', name='aba_fiducials2')
     trisp.scale *= RES
 
 
 """ Fiducials dataframe. """
 aba_fids = pd.DataFrame(columns=['id', 'ap', 'dv', 'lm'])
 aba_fids['id'] = ['cca', 'act', 'dg', 'ccp', 'sco']
-aba_fids.loc[:, ['ap', 'dv', 'lm']] = np.vstack((f_cca, f_act, f_dg, f_ccp, f_sco))
+aba_fids.loc[:, ['ap', 'dv', 'lm']] = fids
 if WRITE_RESULT:
     aba_fids.round(1).to_csv(os.path.join(CSV_PATH, 'aba_%dum_fiducials.csv' % RES), index=False)
 
 
 """ Rectangles dataframe. """
-aba_rects = pd.DataFrame(np.hstack((np.arange(idx_a, idx_p)[:, np.newaxis], np.stack((idx_d, idx_v, np.tile(idx_m, idx_l.shape), idx_l), axis=1)[idx_a:idx_p])), 
-                         columns=['ap', 'd', 'v', 'm', 'l'])
+aba_rects = pd.DataFrame({'ap': ap_coords,
+                          'd': idx_d[idx_a:idx_p],
+                          'v': idx_v[idx_a:idx_p],
+                          'm': np.full(ap_coords.size, idx_m),
+                          'l': idx_l[idx_a:idx_p]})
 if WRITE_RESULT:
     aba_rects.round(0).to_csv(os.path.join(CSV_PATH, 'aba_%dum_rectangles.csv' % RES), index=False)
 
@@ -41,25 +41,30 @@ else:
     
 aba100 = aba.annotation[::AP_DOWNSAMPLE, :, :]
 
-def add_to_df(df, aba_id, ztxt):
-    if aba_id == 0: return
-    for v in aba.structures[aba_id]['structure_id_path'][:-1]:
-        add_to_df(df, v, ztxt)
-    if aba_id not in df.index:
-        df.loc[aba_id, 'structure_id_path'] = '/'.join(['%d' % v for v in aba.structures[aba_id]['structure_id_path']])
-        df.loc[aba_id, 'name'] = aba.structures[aba_id]['name']
-        df.loc[aba_id, 'acronym'] = aba.structures[aba_id]['acronym']
-        color = aba.structures[aba_id]['rgb_triplet']
-        df.loc[aba_id, 'r'] = color[0]
-        df.loc[aba_id, 'g'] = color[1]
-        df.loc[aba_id, 'b'] = color[2]
-    df.loc[aba_id, ztxt] = 1
-    return
+def new_row(aba_id):
+    structure = aba.structures[aba_id]
+    color = structure['rgb_triplet']
+    return {'structure_id_path': '/'.join(['%d' % v for v in structure['structure_id_path']]),
+            'name': structure['name'],
+            'acronym': structure['acronym'],
+            'r': color[0],
+            'g': color[1],
+            'b': color[2]}
 
 z_range = range(60, 85)
-df = pd.DataFrame(columns=['id', 'structure_id_path', 'name', 'acronym', 'r', 'g', 'b'] + ['%d' % z for z in z_range]).set_index('id')
+rows = {}  # Plain dicts (ancestors inserted before descendants); dataframe is built once at the end.
 for z in z_range:
-    aba_ids = np.unique(aba100[z, ...])
-    for aba_id in aba_ids:
-        add_to_df(df, aba_id, '%d' % z)
+    ztxt = '%d' % z
+    for aba_id in np.unique(aba100[z, ...]):
+        if aba_id == 0: continue
+        # structure_id_path runs from root down to aba_id itself, so no recursion is needed.
+        for v in aba.structures[aba_id]['structure_id_path']:
+            row = rows.get(v)
+            if row is None:
+                row = rows[v] = new_row(v)
+            row[ztxt] = 1
+# Object dtype keeps the 1/blank plane flags and integer colors written as before.
+df = pd.DataFrame(list(rows.values()), index=list(rows), dtype=object,
+                  columns=['structure_id_path', 'name', 'acronym', 'r', 'g', 'b'] + ['%d' % z for z in z_range])
+df.index.name = 'id'
 df.to_csv(os.path.join(CSV_PATH, '%s%d_used_ontology_list.csv' % (ATLAS, AP_BIN_SIZE)))
\ No newline at end of file
@@ -24,6 +24,8 @@ import numpy as np
 import pandas as pd
 import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.collections import PolyCollection
 import cv2
 
 # Custom modules.
@@ -65,15 +67,22 @@ else:
 aba100 = aba.annotation[::AP_DOWNSAMPLE, :, :]
 
 # Extract vectorized outlines from a slice of atlas annotation volume.
-def plot_vectorized_aba(ax, df, aba_id_selection, z, rdp_eps=0):
+# chain_approx=cv2.CHAIN_APPROX_TC89_KCOS gives fewer vertices on curved boundaries without a separate rdp pass.
+def plot_vectorized_aba(ax, df, aba_id_selection, z, rdp_eps=0, chain_approx=cv2.CHAIN_APPROX_SIMPLE):
+    layer_ids, layer_inv = np.unique(aba100[z, ...], return_inverse=True)
+    layer_inv = layer_inv.reshape(aba100.shape[1:])
+    tf = np.empty(layer_inv.shape, dtype=bool)  # Mask buffer reused for every region.
+    # Map each id to itself + all ids below it in the ontology (split paths once instead of a substring search per id).
+    descendants = {}
+    for id, path in zip(df.index, df['structure_id_path']):
+        for v in path.strip('/').split('/'):
+            descendants.setdefault(int(v), []).append(id)
+    polys, fcs, ecs = [], [], []
     for aba_id in aba_id_selection:
         if aba_id == 0: continue  # empty space
-        layer = aba100[z, ...]
-        tf = np.zeros(layer.shape, dtype='uint8')
-        idx = df['structure_id_path'].str.contains('/%d/' % aba_id)
-        for id in df.index[idx]:
-            tf[layer == id] = 1
-        contours, hierarchy = cv2.findContours(tf, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+        # Test only the ids present in the slice, then map back to pixels into the same buffer.
+        np.take(np.isin(layer_ids, descendants.get(aba_id, [])), layer_inv, out=tf)
+        contours, hierarchy = cv2.findContours(tf.view(np.uint8), cv2.RETR_CCOMP, chain_approx)
         fc = df.loc[aba_id]['fill?']
         if ',' in str(fc):  # dumb, don't care.
             fc = np.fromstring(df.loc[aba_id, 'fill?'], sep=',')
@@ -82,39 +91,50 @@ def plot_vectorized_aba(ax, df, aba_id_selection, z, rdp_eps=0):
             fc = 'none'
             ec = [0, 0, 0, 1]
         for contour in contours:
+            if rdp_eps > 0:
+                contour = cv2.approxPolyDP(contour, rdp_eps, True)  # Ramer-Douglas-Peucker on the closed contour.
             points = contour.squeeze()
             if points.ndim == 1: continue  # Just a single point!
-            points = np.vstack((points, points[0, :]))
-            if rdp_eps > 0:
-                points = rdp(points, rdp_eps)
-            ax.fill(points[:, 0], points[:, 1], edgecolor=ec, facecolor=fc, linestyle='-', linewidth=0.5)
+            polys.append(points)  # No need to repeat first point, PolyCollection closes each path.
+            fcs.append(fc)
+            ecs.append(ec)
+    # One collection for all contours (same draw order as one ax.fill per contour).
+    if polys:
+        ax.add_collection(PolyCollection(polys, facecolors=fcs, edgecolors=ecs, linestyle='-', linewidths=0.5, joinstyle='miter'))
     return ax
 
-def add_box(ax, yx, bin, color, **kwargs):
-    corners = np.array([yx + np.array([0, 0]),
-                        yx + np.array([bin, 0]),
-                        yx + np.array([bin, bin]),
-                        yx + np.array([0, bin])])
-    # note order of dims!                 
-    ax.fill(corners[:, 1], corners[:, 0], facecolor=color, **kwargs)
+# Load the manually curated regions_to_plot sheet (read once, shared by all plates).
+def load_regions_to_plot():
+    df = pd.read_excel(os.path.join(XLSX_PATH, '%s100_regions_to_plot.xlsx' % ATLAS)).set_index('id')
+    # Wrap paths in slashes so every id (incl. first/last) is delimited on both sides.
+    df['structure_id_path'] = '/' + df['structure_id_path'].astype(str) + '/'
+    return df
+
+# Add all boxes as a single PolyCollection (rasterized=True embeds them as one image in a PDF).
+def add_boxes(ax, yxs, bin, colors, **kwargs):
+    corners = np.array([[0, 0], [bin, 0], [bin, bin], [0, bin]])
+    boxes = (yxs[:, None, :] + corners)[..., ::-1]  # note order of dims!
+    ax.add_collection(PolyCollection(boxes, facecolors=colors, **kwargs))
     return ax
 
 # Display vectorized atlas outlines and normalized cell count bins on a 2D plane.
-# Creates a pyplot fig which can be saved as a PDF.
-def make_plot_for_z(z, add_grid=True, all_lines=False, show=True):
-    df = pd.read_excel(os.path.join(FIG_PATH, '%s100_regions_to_plot.xlsx' % ATLAS)).set_index('id')
-    df['structure_id_path'] = df['structure_id_path'].astype(str)
-    for idx in df.index:  # This is dumb, but avoids false matches because I'm doing this using strings.
-        df.loc[idx, 'structure_id_path'] = '/' + df.loc[idx, 'structure_id_path'] + '/'
-        tf = df.loc[:, z] == 1
+# Creates a fig which can be saved as a PDF (a pyplot fig only if shown).
+# df is the regions_to_plot table from load_regions_to_plot().
+def make_plot_for_z(z, df, add_grid=True, all_lines=False, show=True, rasterize_grid=False):
+    tf = df.loc[:, z] == 1
     if not all_lines:
         tf = (df.loc[:, 'use?'] == 1) & tf
-    fig, ax = plt.subplots(figsize=(20,20))
+    if show:
+        fig, ax = plt.subplots(figsize=(20,20))
+    else:  # Not registered with pyplot, so batch plates are not held open.
+        fig = Figure(figsize=(20,20))
+        ax = fig.subplots()
     ax = plot_vectorized_aba(ax, df, df.index[tf], z)
     if add_grid:
-        xys = np.array(np.nonzero(aba100_bin_mean[z, ...])).T
-        for xy in xys:
-            ax = add_box(ax, xy * bin, bin=bin, color=cmap(aba100_bin_mean_v[z, xy[0], xy[1]].astype(float)), edgecolor='none')
+        on_z = bin_zyx[:, 0] == z
+        xys = bin_zyx[on_z, 1:]
+        colors = cmap(bin_v[on_z].astype(float))
+        ax = add_boxes(ax, xys * bin, bin=bin, colors=colors, edgecolors='none', rasterized=rasterize_grid)
     ax.axis('equal')
     ax.set_xlim([0, aba100.shape[2]])
     ax.set_ylim([0, aba100.shape[1]])
@@ -146,9 +166,8 @@ for bi, b in enumerate(BRAINS):
     aba_cc[b] = get_brain_coords(b, CSV_PATH, RES, ATLAS, filter_column=F_COLUMN, filter_method=F_METHOD, filter_threshold=F_THRESHOLD)
     aba100_cc[b] = aba_cc[b] / (np.array([AP_DOWNSAMPLE, 1, 1]) * aba.resolution[0])
     aba_nv[b] = len(aba_cc[b])
-    tmp_bin = np.round((aba100_cc[b] - bin_offset) / [1, bin, bin]).astype(int)  # Only binning on x/y.  Use offset to make binning match pixel display e.g., 5700<=x<5800.
-    for row in tmp_bin:
-        aba100_bin[bi, row[0], row[1], row[2]] += 1
+    tmp_bin = np.round((aba100_cc[b] - bin_offset) / [1, bin, bin]).astype(np.int32)  # Only binning on x/y.  Use offset to make binning match pixel display e.g., 5700<=x<5800.
+    np.add.at(aba100_bin[bi], tuple(tmp_bin.T), 1)  # Unbuffered, so repeated bins are all counted.
     aba100_bin[bi, ...] /= aba_nv[b]
 
 aba100_bin_mean = np.mean(aba100_bin, axis=0)
@@ -156,18 +175,26 @@ bmax = np.nanmax(aba100_bin_mean)
 #bmax = np.floor(bmax * 1e3) / 1e3  # round down to tenth of percent
 bmax = .006  # Fix upper limit of color scale to 0.6% for final figures.
 aba100_bin_mean_v = aba100_bin_mean / bmax
+# Nonzero bins and their scaled values, found once for both the 2D plates and the 3D dots.
+bin_zyx = np.argwhere(aba100_bin_mean)
+bin_v = aba100_bin_mean_v[tuple(bin_zyx.T)]
 
 # Show bins in napari.
 hmean = viewer.add_image(aba100_bin_mean, scale=np.array([AP_DOWNSAMPLE, bin, bin]) * RES, translate=(bin_offset * RES), colormap=COLORMAP, name='brain bin%d avg' % (bin * RES), visible=True, contrast_limits=[0, bmax])
 
 # Iterate through 100um plates and output PDFs.
 z_range = range(60, 85)
+df_regions = load_regions_to_plot()
 for z in z_range:
-    fig = make_plot_for_z(z, add_grid=1, all_lines=0, show=0)
-    fig.savefig(os.path.join(FIG_PATH, '__%s_output_%d.pdf' % (ATLAS, z)))
+    fig = make_plot_for_z(z, df_regions, add_grid=1, all_lines=0, show=0)
+    fig.savefig(os.path.join(FIG_PATH, '__%s_output_%d.pdf' % (ATLAS, z)), dpi=300)  # dpi only applies to rasterized parts.
+    plt.close(fig)
 
 # Create PDF of scale colorbar.
-fig.colorbar(matplotlib.cm.ScalarMappable(norm=None, cmap=cmap), ax=fig.get_axes()[0])
+fig = Figure(figsize=(20,20))
+ax = fig.subplots()
+ax.axis('off')
+fig.colorbar(matplotlib.cm.ScalarMappable(norm=None, cmap=cmap), ax=ax)
 fig.savefig(os.path.join(FIG_PATH, '__%s_output_colorbar.pdf' % ATLAS))
 
 # Visualize key brain regions in 3D.
@@ -181,13 +208,11 @@ elif ATLAS == 'kim':
 load_aba_3d('root', aba=aba, colormap='gray', blending='translucent_no_depth', shading='smooth', opacity=0.05, visible=False)
 
 # Create 3D dot equivalents of 2D bins.
-zyx = np.array(np.nonzero(aba100_bin_mean)).T
-c = aba100_bin_mean_v[np.nonzero(aba100_bin_mean)]
-colors = cmap(c)
-colors[:, -1] = c
+colors = cmap(bin_v)
+colors[:, -1] = bin_v
 colors[colors > 1] = 1
-msize = c * 10
-viewer.add_points((zyx * [1, bin, bin]) + bin_offset, size=msize, scale=[100, 10, 10], face_color=colors, border_color='none', border_width=0, blending='minimum', name='binned points')
+msize = bin_v * 10
+viewer.add_points((bin_zyx * [1, bin, bin]) + bin_offset, size=msize, scale=[100, 10, 10], face_color=colors, border_color='none', border_width=0, blending='minimum', name='binned points')
 
 # Create 3D dot scale.
 scale_points = np.array([[69, 50, 77], [69, 51, 77], [69, 52, 77], [69, 53, 77], [69, 54, 77], [69, 55, 77]])
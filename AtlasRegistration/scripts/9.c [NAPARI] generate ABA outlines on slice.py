@@ -18,8 +18,10 @@ import matplotlib.pyplot as plt
 # Custom modules.
 sys.path.insert(0, PKG_PATH)
 from rothetal_pkg.napari.aba import get_aba
-from rothetal_pkg.napari.aba import load_aba_as_mesh
 from rothetal_pkg.napari.vedo import clip_lines
+from rothetal_pkg.napari.vedo import is_triangles
+from rothetal_pkg.napari.vedo import slice_mesh
+from rothetal_pkg.napari.vedo import load_aba_transformed
 from rothetal_pkg.napari.thal import filter_brain_coords
 from rothetal_pkg.napari.affine3d import apply_affine
 
@@ -52,15 +54,16 @@ def show_vedo_slice_mod(ax, mesh, layer=None, origin=(0,0,0), normal=(1,0,0), tr
         viewer = napari.current_viewer()
     if not isinstance(mesh, Mesh):
         mesh = napari2vedo(mesh)
-    lines = mesh.intersect_with_plane(origin=origin, normal=normal).join_segments(tol=tol)
+    # Axis-aligned cuts reuse the face bounds cached on MESH, so each further z only visits spanning triangles.
+    lines = slice_mesh(mesh, origin=origin, normal=normal, tol=tol)
     if (not lines) or (lines is None):
         # No slice, exit.
         print('No intersecting slice at origin: %s, normal: %s ...' % (origin, normal))
         return layer
     if type=='path':
-        lines = [(np.vstack((line.vertices, line.vertices[0, ...])) + translation) * (1. / scale) for line in lines]
+        lines = [(np.vstack((line, line[0, ...])) + translation) * (1. / scale) for line in lines]
     else:
-        lines = [np.array(line.vertices + translation) * (1. / scale) for line in lines]
+        lines = [np.array(line + translation) * (1. / scale) for line in lines]
     # This is a lil' messy.
     lines = clip_lines(lines, [(clip[i] + translation[i]) / scale[i] if clip[i] is not None else None for i in range(3)], clip_r)
     if not lines:
@@ -86,18 +89,21 @@ def transform_and_slice_mesh_mod(ax, mesh, zs, at=None, translations=None, scale
         for m in mesh:
             ax = transform_and_slice_mesh_mod(ax, m, zs, at=at, translations=translations, scale=scale, clip=clip, color=color, name=name, aba=aba)
         return
-    try:  # Try MESH as a string, for which we mean an ABA object... convenience!
-        obj = load_aba_as_mesh(mesh, aba=aba)
-        name = mesh
-    except:
-        obj = mesh
     if at is None:
         at = np.eye(4)
     if translations is None:
         translations = np.zeros((len(zs), 3))
     if clip is None:
         clip = [None] * 3
-    obj = apply_affine(obj, at)
+    try:  # Try MESH as a string, for which we mean an ABA object... convenience!
+        # Transformed arrays are cached per structure/affine, so re-running the figure skips the OBJ read + transform.
+        obj = Mesh(list(load_aba_transformed(mesh, aba, np.asarray(at, dtype=float).tobytes())))
+        name = mesh
+    except:
+        obj = apply_affine(mesh, at)
+        # Triangulate once here, so slice-culling caches on OBJ are reused for every z.
+        if not is_triangles(obj.cells):
+            obj = obj.triangulate()
     layer = None
     for t, z in enumerate(zs):
         ax = show_vedo_slice_mod(ax, obj, layer=layer, origin=(z,0,0), normal=(1,0,0), translation=translations[t, :], scale=scale,